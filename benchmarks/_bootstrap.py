@@ -0,0 +1,23 @@
+"""基准脚本的公共初始化：在临时数据目录中启动 NoneBot 并加载插件。"""
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def load_plugin(**config):
+    """初始化 NoneBot 并加载插件，返回插件模块。
+
+    额外的关键字参数会作为全局配置传给 nonebot.init。
+    """
+    import nonebot
+
+    data_dir = tempfile.mkdtemp(prefix="qqmusic_reco_bench_")
+    config.setdefault("log_level", "WARNING")
+    nonebot.init(localstore_data_dir=data_dir, localstore_cache_dir=data_dir,
+                 localstore_config_dir=data_dir, **config)
+    nonebot.load_plugin("nonebot_plugin_qqmusic_reco")
+    return sys.modules["nonebot_plugin_qqmusic_reco"]
@@ -0,0 +1,60 @@
+"""对比串行、并发与批量拉取歌单时 get_recommendation 的端到端耗时及上游请求数。
+
+用法：python benchmarks/bench_fetch.py [--latency 0.1] [--songs 300]
+"""
+import argparse
+import asyncio
+import time
+
+from _bootstrap import load_plugin
+from fake_qqmusic import FakeQQMusicServer
+
+
+async def run(latency: float, songs: int, counts, rounds: int):
+    plugin = load_plugin()
+    from nonebot_plugin_qqmusic_reco.config import Config
+    from nonebot_plugin_qqmusic_reco.data_source import QQMusicReco
+
+    async with FakeQQMusicServer(latency=latency, songs_per_playlist=songs) as server:
+        print(f"假接口: {server.url}  延迟 {latency * 1000:.0f}ms  每单 {songs} 首")
+        print(f"{'歌单数':>6} {'串行(ms)':>10} {'并发(ms)':>10} {'批量(ms)':>10} {'加速':>6} "
+              f"{'串行请求数':>10} {'并发请求数':>10} {'批量请求数':>10}")
+        fetch_concurrency = plugin.config.qqmusic_fetch_concurrency
+        variants = ((1, 1), (fetch_concurrency, 1), (fetch_concurrency, plugin.config.qqmusic_batch_size))
+        for n in counts:
+            playlists = [str(10_000_000 + i) for i in range(n)]
+            times, requests = [], []
+            for width, batch_size in variants:
+                # 关闭缓存，保证每轮都真实请求
+                cfg = Config(qqmusic_playlist_api=server.url, qqmusic_cache_ttl=0,
+                             qqmusic_fetch_concurrency=width, qqmusic_fetch_deadline=0,
+                             qqmusic_batch_size=batch_size)
+                service = QQMusicReco(cfg)
+                await service.startup()
+                try:
+                    await service.get_recommendation(playlists[:1], 3)  # 预热连接
+                    before = server.request_count
+                    start = time.perf_counter()
+                    for _ in range(rounds):
+                        await service.get_recommendation(playlists, 3)
+                    times.append((time.perf_counter() - start) / rounds * 1000)
+                    requests.append((server.request_count - before) / rounds)
+                finally:
+                    await service.shutdown()
+            print(f"{n:>6} {times[0]:>10.1f} {times[1]:>10.1f} {times[2]:>10.1f} {times[0] / times[2]:>5.1f}x "
+                  f"{requests[0]:>10.0f} {requests[1]:>10.0f} {requests[2]:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--songs", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--counts", type=str, default="1,2,5,10,20")
+    args = parser.parse_args()
+    counts = [int(c) for c in args.counts.split(",")]
+    asyncio.run(run(args.latency, args.songs, counts, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""规模基准：本地假 QQ 音乐接口 + 模拟 Bot，驱动定时推送与即时推荐。
+
+push 模式：按 --groups 建立群订阅，调用 refresh_jobs() 注册定时任务，再直接执行调度器里
+的任务函数(先预热、后推送)，统计每个群从时间槽触发到最后一条消息送达的耗时；
+预热耗时单独列出，--no-prewarm 时拉取歌单的耗时计入推送。
+reco 模式：并发调用 get_recommendation，统计单次调用耗时。
+
+每个场景先冷启动(缓存为空)跑一轮，再在缓存已热的情况下跑一轮。
+
+用法：
+  python benchmarks/bench_fleet.py --mode push --groups 1,100,1000,5000 --playlists 1,10,50
+  python benchmarks/bench_fleet.py --mode reco --concurrency 1,10,100 --playlists 1,10,50 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import math
+import sys
+import time
+from typing import Dict, List
+
+from _bootstrap import load_plugin
+from fake_bot import FakeBot
+from fake_qqmusic import FakeQQMusicServer, parse_size
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+    return values[k]
+
+
+def peak_rss_mib() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KiB，macOS 为字节
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def playlists_of(reco: int, playlists: int) -> List[str]:
+    return [str(10_000_000 + reco * playlists + j) for j in range(playlists)]
+
+
+async def reset(plugin):
+    svc = plugin.reco_service
+    svc.cache.invalidate()
+    svc.invalidate_indexes()
+    svc.upstream_requests = svc.coalesced = 0
+    plugin.metrics.reset()
+    plugin.pusher.warmed.clear()
+    await plugin.sender.shutdown()
+
+
+def configure(plugin, groups: int, playlists: int, recos: int, slots: int):
+    from nonebot_plugin_qqmusic_reco.models import GroupSettings, RecoItem
+
+    m = plugin.manager
+    recos = min(recos, groups)
+    # 直接替换内存中的配置，不写盘
+    m.reco_data = {
+        f"bench{r}": RecoItem(creator=None, playlists=playlists_of(r, playlists)) for r in range(recos)
+    }
+    m.group_data = {
+        str(100_000 + i): GroupSettings(
+            group_id=str(100_000 + i), reco_name=f"bench{i % recos}", timer_value=str(8 + i % slots), output_n=3,
+        )
+        for i in range(groups)
+    }
+    plugin.refresh_jobs()
+
+
+async def run_push(plugin, server: FakeQQMusicServer, bot: FakeBot) -> Dict[str, float]:
+    from nonebot_plugin_apscheduler import scheduler
+    from nonebot_plugin_qqmusic_reco.push import JOB_PREFIX, PREWARM_PREFIX
+
+    jobs = {}
+    for job in scheduler.get_jobs():
+        if job.id.startswith(PREWARM_PREFIX):
+            jobs.setdefault(job.args[0], [None, None])[0] = job
+        elif job.id.startswith(JOB_PREFIX):
+            jobs.setdefault(job.args[0], [None, None])[1] = job
+
+    bot.reset()
+    requests, errors = server.request_count, server.error_count
+    latencies: List[float] = []
+    prewarm_time = push_time = 0.0
+    for _, (prewarm, push) in sorted(jobs.items()):
+        if prewarm is not None:
+            start = time.perf_counter()
+            await prewarm.func(*prewarm.args)
+            prewarm_time += time.perf_counter() - start
+        sent = len(bot.sent)
+        start = time.perf_counter()
+        await push.func(*push.args)
+        push_time += time.perf_counter() - start
+        # 各群在本槽最后一条消息的送达时间
+        last = {group_id: at for group_id, at in bot.sent[sent:]}
+        latencies.extend(at - start for at in last.values())
+
+    return {
+        "prewarm": prewarm_time * 1000,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "throughput": len(bot.sent) / push_time if push_time else 0.0,
+        "upstream": server.request_count - requests,
+        "errors": server.error_count - errors,
+        "failed": bot.failed,
+    }
+
+
+async def run_reco(plugin, server: FakeQQMusicServer, playlists: List[str], concurrency: int) -> Dict[str, float]:
+    svc = plugin.reco_service
+    requests, errors = server.request_count, server.error_count
+    latencies: List[float] = []
+
+    async def one():
+        start = time.perf_counter()
+        await svc.get_recommendation(playlists, 3)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "throughput": concurrency / elapsed if elapsed else 0.0,
+        "upstream": server.request_count - requests,
+        "errors": server.error_count - errors,
+    }
+
+
+async def main_async(args):
+    plugin = load_plugin(
+        log_level="ERROR",
+        qqmusic_catalog=False,
+        qqmusic_push_spread=args.spread,
+        qqmusic_send_rate=args.send_rate,
+        qqmusic_send_retry_delay=0.01,
+        qqmusic_prewarm_seconds=0 if args.no_prewarm else 60,
+        qqmusic_render=args.render,
+    )
+    from nonebot_plugin_qqmusic_reco import push
+
+    bot = FakeBot(latency=args.send_latency, error_rate=args.send_error_rate, seed=1)
+    # 推送只会发给 get_bots() 返回的 Bot
+    push.get_bots = lambda: {bot.self_id: bot}
+
+    server = FakeQQMusicServer(latency=args.latency, songs_per_playlist=parse_size(args.songs),
+                               error_rate=args.error_rate, jitter=args.jitter, seed=1)
+    groups_list = [int(x) for x in args.groups.split(",")]
+    playlists_list = [int(x) for x in args.playlists.split(",")]
+    concurrency_list = [int(x) for x in args.concurrency.split(",")]
+
+    async with server:
+        plugin.config.qqmusic_playlist_api = server.url
+        print(f"假接口: 延迟 {args.latency * 1000:.0f}ms(+{args.jitter * 1000:.0f}ms 抖动)，"
+              f"每单 {args.songs} 首，错误率 {args.error_rate:.0%}；Bot 发送延迟 {args.send_latency * 1000:.0f}ms")
+        try:
+            if args.mode == "push":
+                print(f"{'群数':>6} {'歌单':>4} {'轮次':>4} {'预热(ms)':>9} {'p50(ms)':>9} {'p99(ms)':>9} {'消息/s':>9} "
+                      f"{'上游请求':>8} {'上游错误':>8} {'发送失败':>8} {'峰值RSS(MiB)':>12}")
+                for playlists in playlists_list:
+                    for groups in groups_list:
+                        await reset(plugin)
+                        configure(plugin, groups, playlists, args.recos, args.slots)
+                        for label in ("冷", "热"):
+                            r = await run_push(plugin, server, bot)
+                            print(f"{groups:>6} {playlists:>4} {label:>4} {r['prewarm']:>9.1f} {r['p50']:>9.1f} {r['p99']:>9.1f} "
+                                  f"{r['throughput']:>9.0f} {r['upstream']:>8} {r['errors']:>8} {r['failed']:>8} "
+                                  f"{peak_rss_mib():>12.1f}")
+            else:
+                print(f"{'并发':>6} {'歌单':>4} {'轮次':>4} {'p50(ms)':>9} {'p99(ms)':>9} {'次/s':>9} "
+                      f"{'上游请求':>8} {'上游错误':>8} {'峰值RSS(MiB)':>12}")
+                for playlists in playlists_list:
+                    for concurrency in concurrency_list:
+                        await reset(plugin)
+                        for label in ("冷", "热"):
+                            r = await run_reco(plugin, server, playlists_of(0, playlists), concurrency)
+                            print(f"{concurrency:>6} {playlists:>4} {label:>4} {r['p50']:>9.1f} {r['p99']:>9.1f} "
+                                  f"{r['throughput']:>9.0f} {r['upstream']:>8} {r['errors']:>8} {peak_rss_mib():>12.1f}")
+            if args.stats:
+                print("\n".join(plugin.metrics.summary()))
+        finally:
+            await plugin.sender.shutdown()
+            await plugin.reco_service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("push", "reco"), default="push")
+    parser.add_argument("--groups", type=str, default="1,100,1000", help="push 模式的群数列表")
+    parser.add_argument("--playlists", type=str, default="1,10", help="每个推荐配置的歌单数列表")
+    parser.add_argument("--concurrency", type=str, default="1,10,100", help="reco 模式的并发调用数列表")
+    parser.add_argument("--recos", type=int, default=10, help="推荐配置数，群按顺序分配")
+    parser.add_argument("--slots", type=int, default=4, help="时间槽数，群按顺序分配")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--songs", type=str, default="300", help='每个歌单的歌曲数，如 "300" 或 "50-2000"')
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--send-latency", type=float, default=0.0)
+    parser.add_argument("--send-error-rate", type=float, default=0.0)
+    parser.add_argument("--send-rate", type=float, default=0.0, help="发送限速(条/秒)，0 为不限速")
+    parser.add_argument("--spread", type=float, default=0.0, help="同一时间槽内错开发送的秒数")
+    parser.add_argument("--no-prewarm", action="store_true")
+    parser.add_argument("--render", choices=("text", "card", "forward"), default="text", help="输出格式")
+    parser.add_argument("--stats", action="store_true", help="结束时输出各阶段耗时统计(最后一个场景)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
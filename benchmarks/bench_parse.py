@@ -0,0 +1,68 @@
+"""对比歌单响应的几种解析方式在合成大歌单上的耗时与峰值内存。
+
+- baseline: 原实现，json.loads 整个响应后给每首歌的 dict 加 source_id
+- hook:     标准库 json + object_hook，解码时逐首投影为 Song
+- orjson:   orjson 解码后投影为 Song（未安装 orjson 时跳过）
+
+用法：python benchmarks/bench_parse.py [--songs 5000] [--rounds 20]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from _bootstrap import load_plugin
+from fake_qqmusic import make_playlist_payload
+
+DISSTID = "7671500210"
+
+
+def baseline(content: bytes, source_id: str):
+    data = json.loads(content)
+    cdlist = data.get("cdlist", [])
+    songs = cdlist[0]["songlist"] if cdlist and cdlist[0].get("songlist") else []
+    for s in songs:
+        s["source_id"] = source_id
+    return songs
+
+
+def measure(func, content: bytes, rounds: int):
+    func(content, DISSTID)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(content, DISSTID)
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+
+    tracemalloc.start()
+    result = func(content, DISSTID)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, retained / 1024 / 1024, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--songs", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    load_plugin()
+    from nonebot_plugin_qqmusic_reco import song as song_mod
+
+    content = json.dumps(make_playlist_payload(DISSTID, args.songs), ensure_ascii=False).encode("utf-8")
+    print(f"合成歌单: {args.songs} 首，响应 {len(content) / 1024 / 1024:.2f} MiB")
+
+    variants = [("baseline", baseline), ("hook", song_mod.parse_with_hook)]
+    if song_mod.orjson is not None:
+        variants.append(("orjson", song_mod.parse_with_orjson))
+    else:
+        print("未安装 orjson，跳过 orjson 方案")
+
+    print(f"{'方案':<10} {'耗时(ms)':>10} {'峰值(MiB)':>10} {'常驻(MiB)':>10} {'歌曲数':>8}")
+    for name, func in variants:
+        elapsed, peak, retained, n = measure(func, content, args.rounds)
+        print(f"{name:<10} {elapsed:>10.1f} {peak:>10.2f} {retained:>10.2f} {n:>8}")
+
+
+if __name__ == "__main__":
+    main()
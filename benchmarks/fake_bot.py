@@ -0,0 +1,33 @@
+"""模拟 OneBot v11 的 Bot，仅实现定时推送用到的 send_group_msg / send_group_forward_msg。"""
+import asyncio
+import random
+import time
+from typing import List, Optional, Tuple
+
+
+class FakeBot:
+    """记录每条群消息的发送时间；可配置发送延迟与失败概率"""
+
+    def __init__(self, self_id: str = "10000", latency: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.self_id = self_id
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.sent: List[Tuple[int, float]] = []
+        self.failed = 0
+
+    async def send_group_msg(self, group_id: int, message):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self.error_rate > 0 and self.rng.random() < self.error_rate:
+            self.failed += 1
+            raise RuntimeError("fake send failure")
+        self.sent.append((int(group_id), time.perf_counter()))
+
+    async def send_group_forward_msg(self, group_id: int, messages):
+        await self.send_group_msg(group_id, messages)
+
+    def reset(self):
+        self.sent.clear()
+        self.failed = 0
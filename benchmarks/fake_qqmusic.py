@@ -0,0 +1,163 @@
+"""本地 QQ 音乐歌单接口替身，仅用于基准测试。
+
+模拟 c.y.qq.com/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg 的返回结构，
+可配置响应延迟与抖动、每个歌单的歌曲数(固定值或区间)以及错误率，只依赖标准库。
+"""
+import asyncio
+import json
+import random
+from typing import Dict, Optional, Set, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = "/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
+
+
+def make_song(disstid: str, i: int) -> Dict:
+    return {
+        "songid": int(disstid[-6:]) * 10000 + i,
+        "songmid": f"{disstid[-6:]}{i:08d}",
+        "songname": f"测试歌曲 {disstid}-{i}",
+        "albumname": f"测试专辑 {i // 12}",
+        "interval": 180 + i % 120,
+        "singer": [{"id": i % 97, "mid": f"S{i % 97:012d}", "name": f"歌手{i % 97}"}],
+        "pay": {"payplay": 0, "payalbum": 0, "paytrackprice": 0},
+        "size128": 3_000_000 + i,
+        "size320": 8_000_000 + i,
+    }
+
+
+def make_cd(disstid: str, songs: int) -> Dict:
+    return {
+        "disstid": disstid,
+        "dissname": f"测试歌单 {disstid}",
+        "songnum": songs,
+        "songlist": [make_song(disstid, i) for i in range(songs)],
+    }
+
+
+def make_playlist_payload(disstid: str, songs: int) -> Dict:
+    return {"code": 0, "cdlist": [make_cd(disstid, songs)]}
+
+
+def parse_size(spec: str) -> Union[int, Tuple[int, int]]:
+    """命令行的歌曲数：如 300，或区间 50-2000"""
+    if "-" in spec:
+        low, high = spec.split("-", 1)
+        return int(low), int(high)
+    return int(spec)
+
+
+class FakeQQMusicServer:
+    """songs_per_playlist 为区间时，每个歌单的歌曲数由 disstid 决定，多次请求保持一致；
+    error_rate 为返回 HTTP 500 的概率，jitter 为在 latency 之上额外的随机延迟上限；
+    batch 为 True 时 disstid 可以用逗号连接多个，为 False 时只返回第一个(模拟不支持批量的接口)。
+    """
+
+    def __init__(self, latency: float = 0.05, songs_per_playlist: Union[int, Tuple[int, int]] = 300,
+                 host: str = "127.0.0.1", port: int = 0, error_rate: float = 0.0, jitter: float = 0.0,
+                 seed: Optional[int] = None, batch: bool = True):
+        self.latency = latency
+        self.songs_per_playlist = songs_per_playlist
+        self.host = host
+        self.port = port
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.batch = batch
+        self.rng = random.Random(seed)
+        self.request_count = 0
+        self.error_count = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._bodies: Dict[str, bytes] = {}
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}{API_PATH}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # 主动断开保活连接，让处理协程正常退出
+            for writer in list(self._writers):
+                writer.close()
+            for _ in range(100):
+                if not self._writers:
+                    break
+                await asyncio.sleep(0.01)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def size_for(self, disstid: str) -> int:
+        if isinstance(self.songs_per_playlist, tuple):
+            return random.Random(disstid).randint(*self.songs_per_playlist)
+        return self.songs_per_playlist
+
+    def cd_for(self, disstid: str) -> bytes:
+        body = self._bodies.get(disstid)
+        if body is None:
+            body = json.dumps(make_cd(disstid, self.size_for(disstid)), ensure_ascii=False).encode("utf-8")
+            self._bodies[disstid] = body
+        return body
+
+    def body_for(self, *disstids: str) -> bytes:
+        return b'{"code":0,"cdlist":[' + b",".join(self.cd_for(d) for d in disstids) + b"]}"
+
+    def respond(self, query: Dict[str, list]) -> bytes:
+        disstids = [d for d in (query.get("disstid") or [""])[0].split(",") if d]
+        if not self.batch:
+            disstids = disstids[:1]
+        return self.body_for(*disstids)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    if line.lower().startswith(b"connection:") and b"close" in line.lower():
+                        keep_alive = False
+
+                self.request_count += 1
+                target = request_line.split(b" ")[1].decode()
+                query = parse_qs(urlsplit(target).query)
+                delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                if self.error_rate > 0 and self.rng.random() < self.error_rate:
+                    self.error_count += 1
+                    status, body = "500 Internal Server Error", b'{"code":-1}'
+                else:
+                    status, body = "200 OK", self.respond(query)
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
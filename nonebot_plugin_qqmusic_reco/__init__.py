@@ -1,20 +1,33 @@
-from nonebot import on_command, require, get_bots, get_plugin_config, logger, get_driver
+from nonebot import on_command, require, get_plugin_config, get_driver, logger
+from nonebot.drivers import ASGIMixin, HTTPServerSetup, Request, Response, URL
 from nonebot.plugin import PluginMetadata
 from nonebot.adapters.onebot.v11 import Bot, Message, GroupMessageEvent, MessageEvent
 from nonebot.params import CommandArg
 from nonebot.permission import SUPERUSER
-from datetime import datetime
 
 require("nonebot_plugin_apscheduler")
 require("nonebot_plugin_localstore")
-from nonebot_plugin_apscheduler import scheduler
+import nonebot_plugin_localstore as store
 
 from .config import Config
+from .catalog import SongCatalog
 from .data_source import QQMusicReco
+from .history import MAX_HISTORY, SongHistory
+from .metrics import metrics, prometheus_text
 from .manager import manager, GroupSettings
+from .push import PushScheduler
+from .render import ForwardMessage
+from .sender import OutboundSender
+from .storage import to_dict
+from .watcher import ConfigWatcher
 
 config = get_plugin_config(Config)
-reco_service = QQMusicReco(config)
+catalog = SongCatalog(store.get_plugin_data_dir() / "catalog.db") if config.qqmusic_catalog else None
+reco_service = QQMusicReco(config, catalog)
+
+driver = get_driver()
+driver.on_startup(reco_service.startup)
+driver.on_shutdown(reco_service.shutdown)
 
 __plugin_meta__ = PluginMetadata(
     name="基于QQ音乐歌单的音乐推荐",
@@ -24,7 +37,11 @@ __plugin_meta__ = PluginMetadata(
 - reco list : 查看可用配置
 - reco create <名> <URL> : 创建配置
 - reco sub <名> <时间> [数量] : (管理员) 订阅定时推送
-- reco reload : (管理员) 重载配置""",
+- reco reload : (管理员) 重载配置
+- reco cache [clear] : (管理员) 查看/清空歌单缓存
+- reco queue : (管理员) 查看定时推送发送队列
+- reco history [条数] [天数] : (管理员) 设置本群定时推送不重复最近的歌曲
+- reco stats [reset] : (管理员) 查看各阶段耗时与错误统计""",
     type="application",
     homepage="https://github.com/ChlorophyTeio/nonebot-plugin-qqmusic-reco",
     config=Config,
@@ -37,137 +54,82 @@ __plugin_meta__ = PluginMetadata(
 
 
 # --- 定时任务逻辑 ---
-def refresh_jobs():
-    # [修改点 1] 降级为 DEBUG：详细的开始时间和系统时间只在调试时需要
-    logger.debug(f"[QQMusicReco] 正在刷新定时任务... 当前系统时间: {datetime.now()}")
-
-    # 1. 清理旧任务
-    removed_count = 0
-    for job in scheduler.get_jobs():
-        if job.id.startswith("reco_push_"):
-            job.remove()
-            removed_count += 1
-
-    if removed_count > 0:
-        # 保持 DEBUG
-        logger.debug(f"[QQMusicReco] 已清理 {removed_count} 个旧定时任务")
-
-    # 2. 添加新任务
-    count_added = 0
-    for gid, setting in manager.group_data.items():
-        if not setting.enable:
-            continue
-
-        if setting.timer_mode == "cron":
-            # 支持 timer_value: "8,12,16:30,20,0"
-            raw_times = str(setting.timer_value).replace("，", ",")  # 兼容中文逗号
-            time_points = [t.strip() for t in raw_times.split(",") if t.strip()]
-
-            for idx, t in enumerate(time_points):
-                try:
-                    if ":" in t:
-                        hour_str, minute_str = t.split(":", 1)
-                        hour = int(hour_str)
-                        minute = int(minute_str)
-                    else:
-                        hour = int(t)
-                        minute = 0
-                except ValueError:
-                    logger.error(f"[QQMusicReco] 群 {gid} 定时格式错误: '{t}'，已跳过")
-                    continue
-
-                # 使用闭包参数锁定变量 h=hour, m=minute
-                async def push(g_id=gid, h=hour, m=minute):
-                    s = manager.group_data.get(g_id)
-                    if not s: return
-
-                    # 获取自定义文案
-                    cute_msg = None
-                    if config.qqmusic_cute_message:
-                        try:
-                            # 构造当前触发的时间点用于判断文案区间
-                            now_trigger = datetime.now().replace(hour=h, minute=m, second=0, microsecond=0)
-                            cute_msg = manager.pick_cute_message(now=now_trigger)
-                        except Exception as e:
-                            logger.warning(f"[QQMusicReco] 获取文案失败: {e}")
-
-                    await_msg = cute_msg if cute_msg else "让我思考一下推荐什么喵..."
-
-                    bots = get_bots()
-                    if not bots:
-                        logger.warning(f"[QQMusicReco] 定时任务触发(群{g_id})，但没有连接的 Bot")
-                        return
-
-                    for bot in bots.values():
-                        try:
-                            # 1. 发送提示语
-                            await bot.send_group_msg(group_id=int(g_id), message=await_msg)
-
-                            # 2. 获取并发送歌曲
-                            reco_config = manager.reco_data.get(s.reco_name)
-                            if not reco_config:
-                                await bot.send_group_msg(group_id=int(g_id), message=f"❌ 找不到推荐配置: {s.reco_name}")
-                                return
-
-                            msg = await reco_service.get_recommendation(reco_config.playlists, s.output_n)
-                            await bot.send_group_msg(group_id=int(g_id), message=msg)
-                            logger.info(f"[QQMusicReco] 群 {g_id} 定时推送 ({h:02d}:{m:02d}) 完成")
-                        except Exception as e:
-                            logger.warning(f"[QQMusicReco] 群 {g_id} 推送异常: {e}")
-
-                job_id = f"reco_push_{gid}_{idx}"
-                scheduler.add_job(
-                    push,
-                    id=job_id,
-                    trigger="cron",
-                    hour=hour,
-                    minute=minute,
-                    misfire_grace_time=60
-                )
-                count_added += 1
-                # [修改点 2] 降级为 DEBUG：每个任务的添加细节只在调试时查看
-                logger.debug(f"[QQMusicReco] 添加任务: 群[{gid}] 时间[{hour:02d}:{minute:02d}] ID[{job_id}]")
+sender = OutboundSender(config)
+history = SongHistory(store.get_plugin_data_dir() / "history.db", config.qqmusic_save_delay)
+pusher = PushScheduler(config, reco_service, manager, sender, history)
+driver.on_shutdown(sender.shutdown)
+driver.on_shutdown(history.close)
 
-        else:
-            # interval 模式
-            try:
-                minutes = int(setting.timer_value)
-            except Exception:
-                logger.warning(f"interval 配置格式错误: {setting.timer_value}")
-                continue
-
-            async def push_interval(g_id=gid):
-                s = manager.group_data.get(g_id)
-                if not s: return
-
-                cute_msg = manager.pick_cute_message() if config.qqmusic_cute_message else None
-                await_msg = cute_msg if cute_msg else "让我思考一下推荐什么喵..."
-
-                bots = get_bots()
-                for bot in bots.values():
-                    try:
-                        await bot.send_group_msg(group_id=int(g_id), message=await_msg)
-                        reco_config = manager.reco_data.get(s.reco_name)
-                        if reco_config:
-                            msg = await reco_service.get_recommendation(reco_config.playlists, s.output_n)
-                            await bot.send_group_msg(group_id=int(g_id), message=msg)
-                    except Exception:
-                        pass
-
-            scheduler.add_job(
-                push_interval,
-                id=f"reco_push_{gid}",
-                trigger="interval",
-                minutes=minutes,
-                misfire_grace_time=60
-            )
-            count_added += 1
 
-    # [保持点] 这个是 INFO，符合你的要求（保留总结性日志）
-    logger.info(f"[QQMusicReco] 定时任务加载完毕，共 {count_added} 个任务。")
+def refresh_jobs():
+    return pusher.refresh()
 
 
-get_driver().on_startup(refresh_jobs)
+driver.on_startup(refresh_jobs)
+
+# 配置文件热重载：只重载被修改的文件，并增量更新受影响群的定时任务
+watcher = ConfigWatcher(
+    manager, config.qqmusic_watch_interval, config.qqmusic_watch_debounce,
+    on_groups_changed=pusher.sync_groups, on_reco_changed=pusher.invalidate_warmed,
+)
+driver.on_startup(watcher.start)
+driver.on_shutdown(watcher.stop)
+driver.on_shutdown(manager.close)
+
+
+# --- 运行指标 ---
+def metric_families():
+    """缓存、上游请求与发送队列的当前状态，附加在阶段耗时之后导出"""
+    st = reco_service.cache.stats()
+    families = [
+        ("qqmusic_reco_upstream_requests_total", "counter", "Requests sent to the playlist API.",
+         [({}, reco_service.upstream_requests)]),
+        ("qqmusic_reco_batch_requests_total", "counter", "Playlist API requests carrying several playlists.",
+         [({}, reco_service.batch_requests)]),
+        ("qqmusic_reco_coalesced_requests_total", "counter", "Playlist loads served by an in-flight request.",
+         [({}, reco_service.coalesced)]),
+        ("qqmusic_reco_cache_lookups_total", "counter", "Playlist cache lookups by result.",
+         [({"result": "hit"}, st["hits"]), ({"result": "stale"}, st["stale_hits"]), ({"result": "miss"}, st["misses"])]),
+        ("qqmusic_reco_cache_evictions_total", "counter", "Playlists evicted from the cache.", [({}, st["evictions"])]),
+        ("qqmusic_reco_cache_refreshes_total", "counter", "Background playlist refreshes.", [({}, st["refreshes"])]),
+        ("qqmusic_reco_cache_songs", "gauge", "Songs currently cached.", [({}, st["songs"])]),
+    ]
+    breakers = reco_service.breakers.stats()
+    families += [
+        ("qqmusic_reco_breaker_open", "gauge", "Circuit breaker state per upstream host (0 closed, 1 open, 2 half-open).",
+         [({"host": h}, {"closed": 0, "open": 1, "half_open": 2}[b["state"]]) for h, b in breakers.items()]),
+        ("qqmusic_reco_breaker_trips", "gauge", "Times the circuit has opened in a row since it last closed.",
+         [({"host": h}, b["trips"]) for h, b in breakers.items()]),
+        ("qqmusic_reco_breaker_rejected_total", "counter", "Requests failed fast while the circuit was open.",
+         [({"host": h}, b["rejected"]) for h, b in breakers.items()]),
+    ]
+    queues = sender.stats()
+    for key, kind, help_text in (
+        ("depth", "gauge", "Messages waiting in the send queue."),
+        ("sent", "counter", "Messages sent."),
+        ("failed", "counter", "Messages that failed after all retries."),
+        ("retries", "counter", "Send retries."),
+    ):
+        name = f"qqmusic_reco_send_{key}" if kind == "gauge" else f"qqmusic_reco_send_{key}_total"
+        families.append((name, kind, help_text, [({"bot": b}, q[key]) for b, q in queues.items()]))
+    return families
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(
+        200,
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        content=prometheus_text(metrics, metric_families()),
+    )
+
+
+if config.qqmusic_metrics_path:
+    if isinstance(driver, ASGIMixin):
+        driver.setup_http_server(HTTPServerSetup(
+            URL(config.qqmusic_metrics_path), "GET", "qqmusic_reco_metrics", metrics_endpoint
+        ))
+    else:
+        logger.warning(f"[QQMusicReco] 当前驱动器不支持 HTTP 服务，无法开启指标接口 {config.qqmusic_metrics_path}")
 
 # --- 指令处理 ---
 reco_cmd = on_command("reco", priority=config.qqmusic_priority, block=config.qqmusic_block)
@@ -199,15 +161,114 @@ async def _(bot: Bot, event: MessageEvent, arg: Message = CommandArg()):
         if not target_reco:
             await reco_cmd.finish("❌ 没有任何可用的推荐配置。")
 
-        res = await reco_service.get_recommendation(target_reco.playlists, count)
-        await reco_cmd.finish(res)
+        for msg in await reco_service.get_recommendation(target_reco.playlists, count):
+            if not isinstance(msg, ForwardMessage):
+                await reco_cmd.send(msg)
+            elif isinstance(event, GroupMessageEvent):
+                await bot.send_group_forward_msg(group_id=event.group_id, messages=msg.nodes(bot.self_id))
+            else:
+                await bot.send_private_forward_msg(user_id=event.user_id, messages=msg.nodes(bot.self_id))
+        await reco_cmd.finish()
 
     # 2. reco reload (SUPERUSER ONLY)
     elif sub_cmd == "reload":
         if not is_su: await reco_cmd.finish("⛔ 权限不足：仅限 SUPERUSER 使用。")
-        manager.load_all()
-        refresh_jobs()
-        await reco_cmd.finish("✅ 配置已重载，定时任务已刷新。")
+        pusher.invalidate_warmed(manager.load_all())
+        reco_service.invalidate_indexes()
+        added, removed, rescheduled = refresh_jobs()
+        await reco_cmd.finish(f"✅ 配置已重载，定时任务已刷新（新增 {added}，移除 {removed}，改期 {rescheduled}）。")
+
+    # 2.1 reco cache [clear] (SUPERUSER ONLY)
+    elif sub_cmd == "cache":
+        if not is_su: await reco_cmd.finish("⛔ 权限不足：仅限 SUPERUSER 使用。")
+        if len(msg_txt) > 1 and msg_txt[1].lower() == "clear":
+            reco_service.cache.invalidate()
+            reco_service.invalidate_indexes()
+            pusher.invalidate_warmed()
+            await reco_cmd.finish("✅ 歌单缓存已清空。")
+        st = reco_service.cache.stats()
+        await reco_cmd.finish(
+            "📦 歌单缓存状态：\n"
+            f"歌单数：{st['playlists']}，歌曲数：{st['songs']}\n"
+            f"命中：{st['hits']}，过期命中：{st['stale_hits']}，未命中：{st['misses']}\n"
+            f"命中率：{st['hit_rate']:.1%}\n"
+            f"后台刷新：{st['refreshes']}，淘汰：{st['evictions']}\n"
+            f"上游请求：{reco_service.upstream_requests}（批量 {reco_service.batch_requests}），"
+            f"合并的重复请求：{reco_service.coalesced}"
+        )
+
+    # 2.2 reco queue (SUPERUSER ONLY)
+    elif sub_cmd == "queue":
+        if not is_su: await reco_cmd.finish("⛔ 权限不足：仅限 SUPERUSER 使用。")
+        stats = sender.stats()
+        if not stats:
+            await reco_cmd.finish("📮 发送队列尚未启用（还没有定时推送）。")
+        await reco_cmd.finish("📮 发送队列状态：\n" + "\n".join(
+            f"- Bot {self_id}: 排队 {st['depth']}，已发 {st['sent']}，失败 {st['failed']}，重试 {st['retries']}，"
+            f"平均耗时 {st['latency_avg']:.2f}s，最大 {st['latency_max']:.2f}s"
+            for self_id, st in stats.items()
+        ))
+
+    # 2.3 reco stats [reset] (SUPERUSER ONLY)
+    elif sub_cmd == "stats":
+        if not is_su: await reco_cmd.finish("⛔ 权限不足：仅限 SUPERUSER 使用。")
+        if len(msg_txt) > 1 and msg_txt[1].lower() == "reset":
+            metrics.reset()
+            await reco_cmd.finish("✅ 统计已清零。")
+        st = reco_service.cache.stats()
+        queues = sender.stats()
+        lines = ["📈 运行统计：", *(metrics.summary() or ["暂无数据"])]
+        lines.append(
+            f"缓存：命中率 {st['hit_rate']:.1%}，{st['playlists']} 个歌单 / {st['songs']} 首，"
+            f"上游请求 {reco_service.upstream_requests}，合并 {reco_service.coalesced}"
+        )
+        if queues:
+            lines.append(
+                f"发送：已发 {sum(q['sent'] for q in queues.values())}，失败 {sum(q['failed'] for q in queues.values())}，"
+                f"排队 {sum(q['depth'] for q in queues.values())}"
+            )
+        for host, b in reco_service.breakers.stats().items():
+            if b["state"] != "closed" or b["rejected"]:
+                state = {"open": f"熔断中（{b['retry_in']:.0f}s 后探测）", "half_open": "探测中"}.get(b["state"], "正常")
+                lines.append(f"上游 {host}：{state}，连续失败 {b['failures']}，快速失败 {b['rejected']} 次")
+        await reco_cmd.finish("\n".join(lines))
+
+    # 2.4 reco history [条数] [天数] | off | clear (SUPERUSER ONLY)
+    elif sub_cmd == "history":
+        if not is_su: await reco_cmd.finish("⛔ 权限不足：仅限 SUPERUSER 使用。")
+        if not isinstance(event, GroupMessageEvent):
+            await reco_cmd.finish("❌ 请在群聊中使用此指令。")
+        gid = str(event.group_id)
+        g_set = manager.group_data.get(gid)
+        if not g_set:
+            await reco_cmd.finish("❌ 本群尚未订阅。")
+
+        args = [a.lower() for a in msg_txt[1:]]
+        if not args:
+            if not g_set.history_n and not g_set.history_days:
+                await reco_cmd.finish("🕘 本群未开启推送去重。\n用法：reco history <条数> [天数] | off | clear")
+            await reco_cmd.finish(f"🕘 本群推送去重：最近 {g_set.history_n or '不限'} 首，{g_set.history_days or '不限'} 天内不重复。")
+        if args[0] == "clear":
+            history.clear(gid)
+            await reco_cmd.finish("✅ 已清空本群推送历史。")
+
+        if args[0] == "off":
+            n, days = 0, 0.0
+        else:
+            try:
+                n = int(args[0])
+                days = float(args[1]) if len(args) > 1 else 0.0
+            except ValueError:
+                await reco_cmd.finish("❌ 格式：reco history <条数> [天数] | off | clear")
+            if n < 0 or days < 0:
+                await reco_cmd.finish("❌ 条数与天数不能为负数。")
+            if n > MAX_HISTORY:
+                await reco_cmd.finish(f"❌ 条数最多为 {MAX_HISTORY}。")
+
+        manager.set_group(GroupSettings(**{**to_dict(g_set), "history_n": n, "history_days": days}))
+        if not n and not days:
+            await reco_cmd.finish("✅ 已关闭本群推送去重。")
+        await reco_cmd.finish(f"✅ 已设置：最近 {n or '不限'} 首，{days or '不限'} 天内推送过的歌曲不再重复。")
 
     # 3. reco sub <推荐名> <模式:时间> <数量> (SUPERUSER ONLY)
     elif sub_cmd == "sub":
@@ -233,20 +294,17 @@ async def _(bot: Bot, event: MessageEvent, arg: Message = CommandArg()):
             await reco_cmd.finish(
                 f"❌ 推荐配置 '{name}' 不存在，请先使用 reco create 创建。\n可用列表: {', '.join(manager.reco_data.keys())}")
 
-        manager.group_data[gid] = GroupSettings(
+        manager.set_group(GroupSettings(
             group_id=gid, reco_name=name, timer_mode=mode, timer_value=val, output_n=num
-        )
-        manager.save_group()
-        refresh_jobs()
+        ))
+        pusher.sync_groups([gid])
         await reco_cmd.finish(f"✅ 订阅成功！\n推荐配置：{name}\n定时：{mode}({val})\n每轮数量：{num}")
 
     # 4. reco unsub / td
     elif sub_cmd in ["unsub", "td"]:
         gid = str(event.group_id)
-        if gid in manager.group_data:
-            del manager.group_data[gid]
-            manager.save_group()
-            refresh_jobs()
+        if manager.remove_group(gid):
+            pusher.sync_groups([gid])
             await reco_cmd.finish("✅ 已取消本群订阅。")
         await reco_cmd.finish("❌ 本群尚未订阅。")
 
@@ -262,6 +320,8 @@ async def _(bot: Bot, event: MessageEvent, arg: Message = CommandArg()):
     elif sub_cmd == "del":
         if len(msg_txt) < 2: await reco_cmd.finish("❌ 格式：reco del <名称>")
         res = manager.del_reco(msg_txt[1], user_id, is_su)
+        if msg_txt[1] not in manager.reco_data:
+            pusher.invalidate_warmed([msg_txt[1]])
         await reco_cmd.finish(res)
 
     # 7. reco list / help
@@ -279,5 +339,9 @@ async def _(bot: Bot, event: MessageEvent, arg: Message = CommandArg()):
             "reco td/unsub - 取消订阅本群\n"
             "--- 管理员指令 ---\n"
             "reco sub <名> <模式:时间> <数量> - 订阅本群\n"
-            "reco reload - 强制重载配置"
+            "reco reload - 强制重载配置\n"
+            "reco cache [clear] - 查看/清空歌单缓存\n"
+            "reco queue - 查看定时推送发送队列\n"
+            "reco history [条数] [天数] - 设置本群推送去重\n"
+            "reco stats [reset] - 查看/清零运行统计"
         )
\ No newline at end of file
@@ -0,0 +1,113 @@
+import time
+import random
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+import httpx
+from nonebot import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """超时、连接错误、5xx 与 429 视为上游故障；其余 4xx 说明上游仍在正常响应"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code >= 500 or code == 429
+    return True
+
+
+class CircuitBreaker:
+    """单个上游主机的熔断器。
+
+    连续失败 threshold 次后打开，期间的请求直接失败，不再等待超时；
+    暂停时间从 base_delay 起每次打开翻倍(上限 max_delay)并带随机抖动，
+    到期后进入半开状态，只放行一个探测请求：成功则关闭，失败则以更长的暂停时间重新打开。
+    """
+
+    def __init__(self, host: str, threshold: int, base_delay: float, max_delay: float, rng=random):
+        self.host = host
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+        self.state = CLOSED
+        self.failures = 0
+        # 连续打开的次数，决定下一次的暂停时间
+        self.trips = 0
+        self.retry_at = 0.0
+        self.probing = False
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def allow(self) -> bool:
+        if not self.enabled or self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() >= self.retry_at:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self):
+        if self.state != CLOSED:
+            logger.info(f"[QQMusicReco] 上游 {self.host} 已恢复，熔断关闭")
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+            self._trip()
+
+    def abort(self):
+        """请求被取消、没有结果：释放探测名额，下次请求重新探测"""
+        self.probing = False
+
+    def _trip(self):
+        delay = min(self.max_delay, self.base_delay * (2 ** self.trips))
+        # 抖动：在 [delay/2, delay] 内随机，避免多个实例同时恢复请求
+        delay = self.rng.uniform(delay / 2, delay)
+        self.trips += 1
+        self.state = OPEN
+        self.probing = False
+        self.retry_at = time.monotonic() + delay
+        logger.warning(f"[QQMusicReco] 上游 {self.host} 连续失败 {self.failures} 次，熔断 {delay:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_in": max(0.0, self.retry_at - time.monotonic()) if self.state == OPEN else 0.0,
+        }
+
+
+class HostBreakers:
+    """按主机划分的熔断器"""
+
+    def __init__(self, threshold: int, base_delay: float, max_delay: float):
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc or url
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(host, self.threshold, self.base_delay, self.max_delay)
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {host: b.stats() for host, b in self.breakers.items()}
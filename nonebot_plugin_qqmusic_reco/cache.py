@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CacheEntry:
+    __slots__ = ("songs", "fetched_at")
+
+    def __init__(self, songs: List, fetched_at: float):
+        self.songs = songs
+        self.fetched_at = fetched_at
+
+
+class PlaylistCache:
+    """按 disstid 缓存歌单内容。
+
+    - 超过 ttl 的条目视为过期，但仍可返回（由调用方在后台刷新）
+    - 按总歌曲数做 LRU 淘汰，避免超大歌单把内存撑爆
+    """
+
+    def __init__(self, ttl: float, max_songs: int):
+        self.ttl = ttl
+        self.max_songs = max_songs
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._total_songs = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str) -> Tuple[Optional[List], bool]:
+        """返回 (歌曲列表, 是否新鲜)，未命中时歌曲列表为 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        self._entries.move_to_end(key)
+        if time.time() - entry.fetched_at < self.ttl:
+            self.hits += 1
+            return entry.songs, True
+
+        self.stale_hits += 1
+        return entry.songs, False
+
+    def put(self, key: str, songs: List, fetched_at: Optional[float] = None):
+        if not self.enabled:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_songs -= len(old.songs)
+
+        self._entries[key] = CacheEntry(songs, time.time() if fetched_at is None else fetched_at)
+        self._total_songs += len(songs)
+        self._evict()
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._entries.clear()
+            self._total_songs = 0
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._total_songs -= len(old.songs)
+
+    def _evict(self):
+        # 至少保留最近写入的一条，哪怕它本身就超过上限
+        while self._total_songs > self.max_songs and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._total_songs -= len(entry.songs)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "playlists": len(self._entries),
+            "songs": self._total_songs,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,73 @@
+import json
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .song import Song
+
+
+class SongCatalog:
+    """歌单内容的本地持久化 (SQLite)。
+
+    每个歌单一行，只保存格式化输出需要的字段，用于重启后的快速预热
+    以及 QQ 音乐接口不可用时的兜底。连接在首次使用时才建立。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS playlist ("
+                "disstid TEXT PRIMARY KEY, fetched_at REAL NOT NULL, songs TEXT NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _pack(songs: List[Song]) -> str:
+        rows = [[s.name, s.mid, s.singers, s.songid] for s in songs]
+        return json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+
+    @staticmethod
+    def _unpack(disstid: str, raw: str) -> List[Song]:
+        return [Song(name, mid, singers, disstid, songid) for name, mid, singers, songid in json.loads(raw)]
+
+    def load_sync(self, disstid: str) -> Optional[Tuple[List[Song], float]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT fetched_at, songs FROM playlist WHERE disstid = ?", (disstid,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self._unpack(disstid, row[1]), row[0]
+
+    def save_sync(self, disstid: str, songs: List[Song], fetched_at: float):
+        packed = self._pack(songs)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO playlist (disstid, fetched_at, songs) VALUES (?, ?, ?)",
+                (disstid, fetched_at, packed),
+            )
+            conn.commit()
+
+    async def load(self, disstid: str) -> Optional[Tuple[List[Song], float]]:
+        return await asyncio.to_thread(self.load_sync, disstid)
+
+    async def save(self, disstid: str, songs: List[Song], fetched_at: float):
+        await asyncio.to_thread(self.save_sync, disstid, songs, fetched_at)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
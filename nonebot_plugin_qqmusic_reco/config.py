@@ -7,4 +7,47 @@ class Config(BaseModel):
     qqmusic_max_pool: int = 200
     qqmusic_output_n: int = 3
     qqmusic_seed: Optional[int] = None
-    qqmusic_cute_message: bool = True
\ No newline at end of file
+    qqmusic_cute_message: bool = True
+    # 输出格式：text 纯文本 / card QQ 音乐卡片(每首一条) / forward 合并转发
+    qqmusic_render: str = "text"
+    # 歌单缓存：过期时间(秒，<=0 关闭缓存) 与缓存的最大总歌曲数
+    qqmusic_cache_ttl: int = 3600
+    qqmusic_cache_max_songs: int = 20000
+    # HTTP 客户端：请求超时(秒)、连接池上限、保活，http2 需要额外安装 h2
+    qqmusic_timeout: float = 10.0
+    qqmusic_max_connections: int = 20
+    qqmusic_max_keepalive: int = 10
+    qqmusic_keepalive_expiry: float = 30.0
+    qqmusic_http2: bool = False
+    # 并发拉取歌单：最大并发数与单次推荐的截止时间(秒，<=0 不限时)
+    qqmusic_fetch_concurrency: int = 5
+    qqmusic_fetch_deadline: float = 15.0
+    # 批量获取：一次请求最多合并的歌单数，<=1 关闭；接口不支持时自动退回逐个获取
+    qqmusic_batch_size: int = 10
+    # 熔断：同一主机连续失败多少次后暂停请求(<=0 关闭)，暂停时间从 base 起逐次翻倍并带抖动，最长 max 秒
+    qqmusic_breaker_threshold: int = 5
+    qqmusic_breaker_base_delay: float = 5.0
+    qqmusic_breaker_max_delay: float = 300.0
+    # 定时推送：同一时间槽内的并发群数，以及把各群错开发送的时间窗口(秒)
+    qqmusic_push_concurrency: int = 8
+    qqmusic_push_spread: float = 30.0
+    # 在每个定时点前多少秒预先拉取歌单并生成推荐消息，<=0 关闭预热
+    qqmusic_prewarm_seconds: int = 60
+    # 定时推送发送队列(每个 Bot 一个)：令牌桶速率(条/秒，<=0 不限速)、突发上限、并行发送数、失败重试
+    qqmusic_send_rate: float = 2.0
+    qqmusic_send_burst: int = 5
+    qqmusic_send_workers: int = 2
+    qqmusic_send_retries: int = 2
+    qqmusic_send_retry_delay: float = 1.0
+    # 配置文件热重载：检查间隔(秒，<=0 关闭) 与文件稳定多久后才重载(秒)
+    qqmusic_watch_interval: float = 2.0
+    qqmusic_watch_debounce: float = 1.0
+    # 配置修改后延迟多少秒合并写盘(<=0 立即在后台写入)
+    qqmusic_save_delay: float = 1.0
+    # 推荐配置与群订阅的存储后端：json(默认) 或 sqlite(首次启用时自动导入现有 JSON)
+    qqmusic_storage: str = "json"
+    # 是否在本地保存歌单内容，用于重启预热与接口故障时兜底
+    qqmusic_catalog: bool = True
+    # Prometheus 文本格式指标的 HTTP 路径(如 /metrics/qqmusic)，为空时不开启；需要支持 HTTP 服务的驱动器
+    qqmusic_metrics_path: Optional[str] = None
+    qqmusic_playlist_api: str = "https://c.y.qq.com/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
@@ -1,20 +1,108 @@
 import re
+import time
 import random
+import asyncio
 import httpx
-from typing import List, Dict, Any, Optional, Union
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional, Set, Tuple, Union
+from nonebot import logger
+from .breaker import HostBreakers, is_upstream_failure
 from .config import Config
+from .cache import PlaylistCache
+from .catalog import SongCatalog
+from .metrics import metrics
+from .render import Rendered, get_renderer, render_songs
+from .sampler import Reservoir, SamplingIndex
+from .song import Song, parse_cdlist, parse_songlist
 
 PLAYLIST_ID_RE = re.compile(r"/playlist/(\d{5,})|disstid=(\d{5,})|id=(\d{5,})")
+# 批量获取：等待同一时刻其他歌单请求加入的时间(秒)，连续几次批量请求被拒后改回逐个获取，
+# 以及改回逐个获取后隔多久(秒)重新试探批量
+BATCH_WINDOW = 0.005
+BATCH_REJECT_LIMIT = 2
+BATCH_RETRY_INTERVAL = 3600.0
 
 
 class QQMusicReco:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, catalog: Optional[SongCatalog] = None):
         self.global_cfg = config
+        self.catalog = catalog
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
             "Referer": "https://y.qq.com/",
             "Accept": "application/json"
         }
+        self.cache = PlaylistCache(config.qqmusic_cache_ttl, config.qqmusic_cache_max_songs)
+        # 进行中的歌单请求，同一 disstid 的并发调用共享同一个 future
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.upstream_requests = 0
+        self.coalesced = 0
+        self.batch_requests = 0
+        # 等待合并成一次请求的歌单：disstid -> future
+        self._batch: Dict[str, asyncio.Future] = {}
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self._batch_rejects = 0
+        # 在此时刻(monotonic)之前不尝试批量
+        self._batch_retry_at = 0.0
+        self.breakers = HostBreakers(
+            config.qqmusic_breaker_threshold, config.qqmusic_breaker_base_delay, config.qqmusic_breaker_max_delay
+        )
+        self._bg_tasks: Set[asyncio.Task] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        # 按 (disstid, 权重) 配置缓存编译好的抽样索引
+        self._indexes: "OrderedDict[Tuple[Tuple[str, float], ...], SamplingIndex]" = OrderedDict()
+        self.renderer = get_renderer(config.qqmusic_render)
+
+    @property
+    def batch_supported(self) -> bool:
+        return time.monotonic() >= self._batch_retry_at
+
+    def _build_client(self) -> httpx.AsyncClient:
+        cfg = self.global_cfg
+        http2 = cfg.qqmusic_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("[QQMusicReco] 未安装 h2，HTTP/2 已回退为 HTTP/1.1（pip install httpx[http2]）")
+                http2 = False
+
+        limits = httpx.Limits(
+            max_connections=cfg.qqmusic_max_connections,
+            max_keepalive_connections=cfg.qqmusic_max_keepalive,
+            keepalive_expiry=cfg.qqmusic_keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            headers=self.headers, timeout=cfg.qqmusic_timeout, limits=limits, http2=http2
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 正常情况下由 startup 创建；未经驱动器启动时(如脚本直接调用)按需创建
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def startup(self):
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+
+    async def shutdown(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        for fut in self._batch.values():
+            fut.cancel()
+        self._batch = {}
+        for task in list(self._bg_tasks):
+            task.cancel()
+        if self._bg_tasks:
+            await asyncio.gather(*self._bg_tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.catalog is not None:
+            self.catalog.close()
 
     def _extract_id(self, p: str) -> Optional[str]:
         p = str(p).strip()
@@ -22,34 +110,230 @@ class QQMusicReco:
         m = PLAYLIST_ID_RE.search(p)
         return next((g for g in m.groups() if g), None) if m else None
 
-    async def fetch_playlist(self, disstid: str) -> List[Dict]:
-        url = "https://c.y.qq.com/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
-        params = {
+    @staticmethod
+    def _params(disstid: str) -> Dict[str, Any]:
+        return {
             "type": 1, "json": 1, "utf8": 1, "disstid": disstid,
             "format": "json", "g_tk": 5381, "platform": "yqq"
         }
+
+    async def _request(self, disstid: str) -> Optional[httpx.Response]:
+        """经熔断器请求歌单接口；熔断打开时不发请求，直接返回 None"""
+        url = self.global_cfg.qqmusic_playlist_api
+        breaker = self.breakers.get(url)
+        if not breaker.allow():
+            return None
+        self.upstream_requests += 1
+        if "," in disstid:
+            self.batch_requests += 1
+        try:
+            with metrics.timer("fetch"):
+                resp = await self.client.get(url, params=self._params(disstid))
+                resp.raise_for_status()
+        except Exception as e:
+            if is_upstream_failure(e):
+                breaker.failure()
+            else:
+                breaker.success()
+            raise
+        except BaseException:
+            breaker.abort()
+            raise
+        breaker.success()
+        return resp
+
+    async def fetch_playlist(self, disstid: str) -> List[Song]:
         try:
-            async with httpx.AsyncClient(headers=self.headers, timeout=10.0) as client:
-                resp = await client.get(url, params=params)
-                data = resp.json()
-                cdlist = data.get("cdlist", [])
-                if cdlist and cdlist[0].get("songlist"):
-                    return cdlist[0]["songlist"]
+            resp = await self._request(disstid)
+            if resp is None:
+                logger.debug(f"[QQMusicReco] 上游熔断中，跳过获取歌单 {disstid}")
                 return []
-        except Exception:
+            with metrics.timer("parse"):
+                # 直接从原始字节解析并投影为 Song，不保留接口返回的完整 dict
+                return parse_songlist(resp.content, disstid)
+        except Exception as e:
+            logger.warning(f"[QQMusicReco] 获取歌单 {disstid} 失败: {type(e).__name__}: {e}")
             return []
 
-    async def get_recommendation(self, playlists: List[Union[str, Dict]], output_n: int = 3) -> str:
-        # 设置随机种子
-        if self.global_cfg.qqmusic_seed is not None:
-            random.seed(self.global_cfg.qqmusic_seed)
-        else:
-            random.seed()
+    async def fetch_playlists(self, disstids: List[str]) -> Dict[str, List[Song]]:
+        """一次请求获取多个歌单(disstid 以逗号连接)，按返回的 cdlist 拆回各歌单。
+
+        批量结果里缺失的歌单改为逐个获取。若批量请求正常返回、最多只包含一个歌单，而逐个获取却能拿到其余的，
+        说明接口不支持批量，连续 BATCH_REJECT_LIMIT 次后改为逐个获取，BATCH_RETRY_INTERVAL 秒后再试探。
+        批量请求本身失败(超时、5xx 等)只是上游暂时故障，不计入。
+        """
+        result: Dict[str, List[Song]] = {}
+        answered = False
+        try:
+            resp = await self._request(",".join(disstids))
+            if resp is None:
+                logger.debug(f"[QQMusicReco] 上游熔断中，跳过获取 {len(disstids)} 个歌单")
+                return {d: [] for d in disstids}
+            with metrics.timer("parse"):
+                result = parse_cdlist(resp.content, disstids)
+            answered = True
+        except Exception as e:
+            logger.warning(f"[QQMusicReco] 批量获取 {len(disstids)} 个歌单失败，改为逐个获取: {type(e).__name__}: {e}")
+
+        found = sum(1 for d in disstids if result.get(d))
+        missing = [d for d in disstids if not result.get(d)]
+        if missing:
+            for d, songs in zip(missing, await asyncio.gather(*(self.fetch_playlist(d) for d in missing))):
+                result[d] = songs
+        if found > 1:
+            if self._batch_rejects >= BATCH_REJECT_LIMIT:
+                logger.info("[QQMusicReco] 歌单接口已支持批量获取")
+            self._batch_rejects = 0
+        elif answered and any(result.get(d) for d in missing):
+            self._batch_rejects += 1
+            # 重新试探时计数没有清零，再被拒一次就再次停用
+            if self._batch_rejects >= BATCH_REJECT_LIMIT:
+                self._batch_retry_at = time.monotonic() + BATCH_RETRY_INTERVAL
+                logger.warning(f"[QQMusicReco] 歌单接口不支持批量获取，{BATCH_RETRY_INTERVAL:.0f}s 内改为逐个请求")
+        return result
+
+    def _fetch(self, disstid: str) -> Awaitable[List[Song]]:
+        """从接口获取单个歌单；开启批量时与同一时刻的其他歌单合并为一次请求"""
+        batch_size = self.global_cfg.qqmusic_batch_size
+        if batch_size <= 1 or not self.batch_supported:
+            return self.fetch_playlist(disstid)
+
+        fut = self._batch.get(disstid)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = self._batch[disstid] = loop.create_future()
+            if len(self._batch) >= batch_size:
+                self._flush_batch()
+            elif self._batch_timer is None:
+                self._batch_timer = loop.call_later(BATCH_WINDOW, self._flush_batch)
+        return fut
+
+    def _flush_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch = self._batch, {}
+        if batch:
+            self._track(asyncio.ensure_future(self._run_batch(batch)))
+
+    async def _run_batch(self, batch: Dict[str, asyncio.Future]):
+        try:
+            if len(batch) == 1:
+                d = next(iter(batch))
+                results = {d: await self.fetch_playlist(d)}
+            else:
+                results = await self.fetch_playlists(list(batch))
+            for d, fut in batch.items():
+                if not fut.done():
+                    fut.set_result(results.get(d, []))
+        finally:
+            # 被取消(如关闭插件)时不让等待者一直挂起
+            for fut in batch.values():
+                if not fut.done():
+                    fut.cancel()
+
+    async def get_playlist(self, disstid: str, wait_stale: bool = False) -> List[Song]:
+        """带缓存的歌单获取：新鲜直接返回，过期先返回旧数据并在后台刷新
+
+        wait_stale 为 True 时(如预热)会等待过期数据刷新完成，刷新失败仍返回旧数据。
+        """
+        if self.cache.enabled:
+            songs, fresh = self.cache.get(disstid)
+            if songs is not None:
+                if not fresh:
+                    if wait_stale:
+                        refreshed = await asyncio.shield(self._load_shared(disstid, refresh=True))
+                        return refreshed or songs
+                    self._schedule_refresh(disstid)
+                return songs
+
+        # asyncio.shield：某个调用方被取消(如超过截止时间)不影响其他等待者
+        return await asyncio.shield(self._load_shared(disstid))
+
+    def _load_shared(self, disstid: str, refresh: bool = False) -> asyncio.Future:
+        """single-flight：同一 disstid 同时只发起一次网络请求"""
+        fut = self._inflight.get(disstid)
+        if fut is not None:
+            self.coalesced += 1
+            return fut
+
+        return self._register(disstid, asyncio.ensure_future(self._load(disstid, refresh)))
+
+    def _register(self, disstid: str, fut: asyncio.Future) -> asyncio.Future:
+        self._inflight[disstid] = fut
+
+        def _done(f: asyncio.Future, d: str = disstid):
+            if self._inflight.get(d) is f:
+                del self._inflight[d]
+
+        fut.add_done_callback(_done)
+        self._track(fut)
+        return fut
 
-        all_songs = []
-        weights_map = {}
+    async def _load(self, disstid: str, refresh: bool) -> List[Song]:
+        # 1. 冷启动：优先用本地目录预热，过期的话先返回再在后台刷新
+        if not refresh and self.catalog is not None and self.cache.enabled:
+            stored = await self._load_catalog(disstid)
+            if stored:
+                songs, fetched_at = stored
+                self.cache.put(disstid, songs, fetched_at)
+                if time.time() - fetched_at >= self.cache.ttl:
+                    # 直接接管 in-flight 位置，避免其他调用方看到过期数据时重复刷新
+                    self._register(disstid, asyncio.ensure_future(self._load(disstid, True)))
+                return songs
 
-        # 1. 解析歌单并获取歌曲
+        # 2. 网络获取
+        songs = await self._fetch(disstid)
+        if songs:
+            fetched_at = time.time()
+            self.cache.put(disstid, songs, fetched_at)
+            if refresh:
+                self.cache.refreshes += 1
+            if self.catalog is not None:
+                self._track(asyncio.ensure_future(self._save_catalog(disstid, songs, fetched_at)))
+            return songs
+
+        if refresh:
+            # 刷新失败时保留旧数据，等下次过期命中再试
+            logger.debug(f"[QQMusicReco] 后台刷新歌单 {disstid} 失败，继续使用缓存")
+            return songs
+
+        # 3. 网络失败：退回本地目录中的旧数据
+        if self.catalog is not None:
+            stored = await self._load_catalog(disstid)
+            if stored:
+                logger.warning(f"[QQMusicReco] 歌单 {disstid} 获取失败，使用本地保存的数据")
+                songs, fetched_at = stored
+                self.cache.put(disstid, songs, fetched_at)
+        return songs
+
+    async def _load_catalog(self, disstid: str) -> Optional[Tuple[List[Song], float]]:
+        try:
+            return await self.catalog.load(disstid)
+        except Exception as e:
+            metrics.error("catalog", e)
+            logger.warning(f"[QQMusicReco] 读取本地歌单目录失败: {e}")
+            return None
+
+    async def _save_catalog(self, disstid: str, songs: List[Song], fetched_at: float):
+        try:
+            await self.catalog.save(disstid, songs, fetched_at)
+        except Exception as e:
+            metrics.error("catalog", e)
+            logger.warning(f"[QQMusicReco] 写入本地歌单目录失败: {e}")
+
+    def _schedule_refresh(self, disstid: str):
+        if disstid not in self._inflight:
+            self._load_shared(disstid, refresh=True)
+
+    def _track(self, task: asyncio.Future):
+        # 持有后台任务引用，防止被回收；关闭时统一取消
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+
+    def _parse_playlists(self, playlists: List[Union[str, Dict]]) -> List[Tuple[str, float]]:
+        """把配置里的歌单项解析为 (disstid, 权重)，无法识别的项直接忽略"""
+        specs = []
         for raw in playlists:
             weight, p_str = 1.0, ""
             if isinstance(raw, dict):
@@ -67,58 +351,114 @@ class QQMusicReco:
 
             disstid = self._extract_id(p_str)
             if disstid:
-                weights_map[disstid] = weight
-                songs = await self.fetch_playlist(disstid)
-                for s in songs:
-                    s["source_id"] = disstid
-                    all_songs.append(s)
-
-        if not all_songs:
-            return "❌ 无法获取歌曲数据，请检查歌单配置。"
-
-        # 2. 池化与截断
-        pool = all_songs
-        max_pool = self.global_cfg.qqmusic_max_pool
-        if len(pool) > max_pool:
-            random.shuffle(pool)
-            pool = pool[:max_pool]
-
-        # 3. 按来源分组以便加权抽取
-        by_pid = {}
-        for s in pool:
-            pid = s["source_id"]
-            by_pid.setdefault(pid, []).append(s)
-
-        picked = []
-        pids = [p for p in by_pid.keys() if weights_map.get(p, 1.0) > 0]
-
-        if not pids:
-            return "❌ 有效歌单为空。"
-
-        final_output_n = max(1, min(output_n, len(pool)))
-
-        # 4. 加权随机抽取
-        for _ in range(final_output_n):
-            live_options = [(p, weights_map.get(p, 1.0)) for p in pids if by_pid.get(p)]
-            if not live_options:
-                break
-
-            lpids, lweights = zip(*live_options)
-            target_pid = random.choices(lpids, weights=lweights, k=1)[0]
-
-            target_list = by_pid[target_pid]
-            picked_song = target_list.pop(random.randrange(len(target_list)))
-            picked.append(picked_song)
-
-        # 5. 格式化输出
-        res = []
-        for i, s in enumerate(picked, 1):
-            singers = " / ".join([str(si.get("name", "未知")) for si in s.get("singer", [])])
-            song_name = s.get('songname', '未知曲目')
-            mid = s.get('songmid', '')
-            link = f"https://y.qq.com/n/ryqq/songDetail/{mid}" if mid else "无需链接"
-
-            res.append(f"{i}. {song_name} - {singers}")
-            res.append(f"   {link}")
-
-        return "\n".join(res)
\ No newline at end of file
+                specs.append((disstid, weight))
+        return specs
+
+    async def _iter_fetch(self, disstids: List[str], wait_stale: bool = False) -> AsyncIterator[Tuple[str, List[Song]]]:
+        """并发获取多个歌单，按到达顺序逐个产出 (disstid, 歌曲)；超过截止时间后不再等待其余歌单"""
+        cfg = self.global_cfg
+        # 开启批量时一次请求可带多个歌单，按请求数而不是歌单数限制并发
+        width = max(1, cfg.qqmusic_batch_size) if self.batch_supported else 1
+        sem = asyncio.Semaphore(max(1, cfg.qqmusic_fetch_concurrency) * width)
+
+        async def one(d: str) -> Tuple[str, List[Song]]:
+            async with sem:
+                return d, await self.get_playlist(d, wait_stale)
+
+        pending = {asyncio.ensure_future(one(d)) for d in dict.fromkeys(disstids)}
+        total = len(pending)
+        deadline = cfg.qqmusic_fetch_deadline
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline if deadline > 0 else None
+        try:
+            while pending:
+                timeout = None if end is None else end - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is not None:
+                        metrics.error("fetch", exc)
+                        logger.warning(f"[QQMusicReco] 获取歌单出错: {type(exc).__name__}: {exc}")
+                        continue
+                    yield task.result()
+        finally:
+            if pending:
+                # 未完成的请求继续在后台跑完，结果会写入缓存供下次使用
+                logger.warning(f"[QQMusicReco] {len(pending)}/{total} 个歌单在 {deadline}s 内未返回，先使用已到达的部分")
+                for task in pending:
+                    self._track(task)
+
+    async def _fetch_all(self, disstids: List[str], wait_stale: bool = False) -> Dict[str, List[Song]]:
+        """并发获取多个歌单，超过截止时间则只返回已到达的部分"""
+        return {d: songs async for d, songs in self._iter_fetch(disstids, wait_stale)}
+
+    async def prepare(self, playlists: List[Union[str, Dict]], wait_stale: bool = False) -> SamplingIndex:
+        """获取歌单并返回该配置的抽样索引；歌单与配置未变化时复用已编译的索引"""
+        specs = self._parse_playlists(playlists)
+        fetched = await self._fetch_all([d for d, _ in specs], wait_stale)
+
+        key = tuple(specs)
+        lists = tuple(fetched.get(d) for d, _ in specs)
+        index = self._indexes.get(key)
+        if index is None or not index.matches(lists):
+            index = SamplingIndex(specs, lists)
+            self._indexes[key] = index
+            while len(self._indexes) > 256:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(key)
+        return index
+
+    def invalidate_indexes(self):
+        self._indexes.clear()
+
+    def _seed(self):
+        # 设置随机种子
+        if self.global_cfg.qqmusic_seed is not None:
+            random.seed(self.global_cfg.qqmusic_seed)
+        else:
+            random.seed()
+
+    def pick(self, index: SamplingIndex, output_n: int = 3,
+             exclude: Optional[Callable[[Song], bool]] = None) -> Optional[List[Song]]:
+        self._seed()
+        with metrics.timer("sample"):
+            return index.draw(output_n, self.global_cfg.qqmusic_max_pool, exclude=exclude)
+
+    def render(self, index: SamplingIndex, output_n: int = 3) -> Rendered:
+        return self.format_songs(self.pick(index, output_n))
+
+    async def sample(self, playlists: List[Union[str, Dict]], output_n: int = 3) -> Optional[List[Song]]:
+        """一次性抽样：歌单边到达边喂入蓄水池，只保留 max_pool 首，不必等全部歌单返回才开始"""
+        specs = self._parse_playlists(playlists)
+        # 与 SamplingIndex 一致：重复的歌单歌曲重复计入，权重以最后一次为准
+        weights = dict(specs)
+        repeats = Counter(d for d, _ in specs)
+
+        self._seed()
+        pool = Reservoir(self.global_cfg.qqmusic_max_pool)
+        # 抽样耗时只统计喂入与抽取本身，不含等待歌单到达的时间
+        elapsed = 0.0
+        async for d, songs in self._iter_fetch(list(weights)):
+            start = time.perf_counter()
+            for _ in range(repeats[d]):
+                pool.offer(d, songs)
+            elapsed += time.perf_counter() - start
+        start = time.perf_counter()
+        picked = pool.draw(weights, output_n)
+        metrics.observe("sample", elapsed + time.perf_counter() - start)
+        return picked
+
+    def format_songs(self, picked: Optional[List[Song]]) -> Rendered:
+        """按配置的输出格式生成要依次发送的消息"""
+        with metrics.timer("format"):
+            return render_songs(self.renderer, picked)
+
+    async def get_recommendation(self, playlists: List[Union[str, Dict]], output_n: int = 3) -> Rendered:
+        if self.global_cfg.qqmusic_seed is not None:
+            # 固定种子时结果不应取决于歌单到达的先后，按配置顺序编译索引后抽取
+            index = await self.prepare(playlists)
+            return self.render(index, output_n)
+        return self.format_songs(await self.sample(playlists, output_n))
@@ -0,0 +1,187 @@
+import time
+import struct
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+from nonebot import logger
+
+from .metrics import metrics
+from .models import GroupSettings
+from .persist import WriteBehind
+
+# 只按天数去重时的默认窗口大小，以及每个群最多记录的歌曲数(环形缓冲按容量预先分配)
+DAYS_ONLY_CAPACITY = 1000
+MAX_HISTORY = 5000
+_HEADER = struct.Struct("<II")
+
+
+def song_key(mid: str) -> int:
+    """songmid 的 64 位稳定哈希(内置 hash 每次启动会变)"""
+    return int.from_bytes(hashlib.blake2b(mid.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def history_capacity(setting: GroupSettings) -> int:
+    if setting.history_n > 0:
+        # 手动编辑的配置文件可能超过上限
+        return min(setting.history_n, MAX_HISTORY)
+    return DAYS_ONLY_CAPACITY if setting.history_days > 0 else 0
+
+
+class RecentSongs:
+    """定长环形缓冲：最近推送过的歌曲哈希与推送时间，每首 12 字节"""
+
+    __slots__ = ("capacity", "hashes", "times", "pos", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.hashes = array("Q", bytes(8 * self.capacity))
+        self.times = array("I", bytes(4 * self.capacity))
+        self.pos = 0
+        self.size = 0
+
+    def add(self, key: int, at: int):
+        self.hashes[self.pos] = key
+        self.times[self.pos] = at
+        self.pos = (self.pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _chronological(self) -> Iterable[int]:
+        start = (self.pos - self.size) % self.capacity
+        return ((start + i) % self.capacity for i in range(self.size))
+
+    def active(self, now: int, max_age: float) -> Set[int]:
+        """窗口内仍然有效的歌曲哈希；max_age <= 0 表示不按时间过期"""
+        if max_age <= 0:
+            return {self.hashes[i] for i in self._chronological()}
+        return {self.hashes[i] for i in self._chronological() if now - self.times[i] < max_age}
+
+    def resized(self, capacity: int) -> "RecentSongs":
+        """调整窗口大小，保留最近的记录"""
+        ring = RecentSongs(capacity)
+        for i in list(self._chronological())[-ring.capacity:]:
+            ring.add(self.hashes[i], self.times[i])
+        return ring
+
+    def pack(self) -> bytes:
+        order = list(self._chronological())
+        hashes = array("Q", (self.hashes[i] for i in order))
+        times = array("I", (self.times[i] for i in order))
+        return _HEADER.pack(self.capacity, self.size) + hashes.tobytes() + times.tobytes()
+
+    @classmethod
+    def unpack(cls, raw: bytes) -> "RecentSongs":
+        capacity, size = _HEADER.unpack_from(raw)
+        ring = cls(capacity)
+        body = raw[_HEADER.size:]
+        hashes = array("Q", body[:8 * size])
+        times = array("I", body[8 * size:12 * size])
+        for key, at in zip(hashes, times):
+            ring.add(key, at)
+        return ring
+
+
+class SongHistory:
+    """按群保存最近推送过的歌曲，用于定时推送去重。
+
+    每个群一行二进制记录，首次用到时才从 SQLite 读入内存；
+    修改经 WriteBehind 合并后在同一个事务里写回。
+    """
+
+    def __init__(self, path: Path, save_delay: float):
+        self.path = path
+        self.writer = WriteBehind(save_delay)
+        self._groups: Dict[str, RecentSongs] = {}
+        self._dirty: Set[str] = set()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS history (group_id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _load_sync(self, group_id: str) -> Optional[RecentSongs]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT data FROM history WHERE group_id = ?", (group_id,)
+            ).fetchone()
+        return RecentSongs.unpack(row[0]) if row else None
+
+    async def _ring(self, setting: GroupSettings) -> Optional[RecentSongs]:
+        capacity = history_capacity(setting)
+        if not capacity:
+            return None
+        gid = setting.group_id
+        ring = self._groups.get(gid)
+        if ring is None:
+            try:
+                ring = await asyncio.to_thread(self._load_sync, gid)
+            except Exception as e:
+                metrics.error("history", e)
+                logger.warning(f"[QQMusicReco] 读取群 {gid} 推送历史失败: {e}")
+                ring = None
+            # 读取期间可能已被并发创建
+            ring = self._groups.setdefault(gid, ring or RecentSongs(capacity))
+        if ring.capacity != capacity:
+            ring = self._groups[gid] = ring.resized(capacity)
+        return ring
+
+    async def seen(self, setting: GroupSettings) -> Optional[Set[int]]:
+        """该群不应重复的歌曲哈希；未开启去重时返回 None"""
+        ring = await self._ring(setting)
+        if ring is None:
+            return None
+        return ring.active(int(time.time()), setting.history_days * 86400)
+
+    async def record(self, setting: GroupSettings, keys: Iterable[int]):
+        ring = await self._ring(setting)
+        if ring is None:
+            return
+        now = int(time.time())
+        for key in keys:
+            ring.add(key, now)
+        self._save_later(setting.group_id)
+
+    def clear(self, group_id: str):
+        # 留一个空记录而不是直接移除：写回前若再次用到，不会从数据库把旧记录读回来
+        self._groups[group_id] = RecentSongs(1)
+        self._save_later(group_id)
+
+    def _save_later(self, group_id: str):
+        self._dirty.add(group_id)
+
+        def prepare():
+            rows = []
+            for gid in self._dirty:
+                ring = self._groups.get(gid)
+                rows.append((gid, ring.pack() if ring is not None and ring.size else None))
+            self._dirty = set()
+            return lambda: self._write(rows)
+
+        self.writer.schedule("history", prepare)
+
+    def _write(self, rows):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for gid, data in rows:
+                    if data is None:
+                        conn.execute("DELETE FROM history WHERE group_id = ?", (gid,))
+                    else:
+                        conn.execute("INSERT OR REPLACE INTO history (group_id, data) VALUES (?, ?)", (gid, data))
+
+    async def close(self):
+        await self.writer.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,45 +1,108 @@
 import json
 import random
-from typing import Dict, List, Union, Any, Optional
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Tuple, Any, Optional
 from datetime import datetime, time
 from pydantic import BaseModel
-from nonebot import logger
+from nonebot import logger, get_plugin_config
 import nonebot_plugin_localstore as store
 from pathlib import Path
 
+from .config import Config
+from .models import RecoItem, GroupSettings
+from .persist import WriteBehind
+from .storage import JsonStorage, SqliteStorage, Storage, file_mtime
 
-class RecoItem(BaseModel):
-    creator: Optional[str] = None
-    playlists: List[Union[str, Dict[str, Any]]]
 
+def _seconds_of_day(t: time) -> float:
+    return t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6
 
-class GroupSettings(BaseModel):
-    group_id: str
-    enable: bool = True
-    reco_name: str = "Default"
-    timer_mode: str = "cron"
-    timer_value: str = "8,10,12,14,18,22,0"
-    output_n: int = 3
+
+class CuteIndex:
+    """话术配置编译后的时间段索引：按所有起止时间切分一天，查询时二分定位所在区段"""
+
+    def __init__(self, cute_config: list):
+        ranges: List[Tuple[float, float, list]] = []
+        for item in cute_config:
+            try:
+                st = _seconds_of_day(time.fromisoformat(item["start_time"]))
+                et = _seconds_of_day(time.fromisoformat(item["end_time"]))
+                messages = list(item.get("messages", []))
+            except Exception as e:
+                logger.warning(f"[QQMusicReco] 话术时间解析错误: {e}")
+                continue
+            if st <= et:
+                ranges.append((st, et, messages))
+            else:
+                # 跨天
+                ranges.append((st, 86400.0, messages))
+                ranges.append((0.0, et, messages))
+
+        self.bounds: List[float] = sorted({0.0, *(r[0] for r in ranges), *(r[1] for r in ranges if r[1] < 86400)})
+        # 每个区段的候选话术，保持配置中的先后顺序
+        self.buckets: List[Tuple[str, ...]] = [
+            tuple(m for st, et, msgs in ranges if st <= b < et for m in msgs)
+            for b in self.bounds
+        ]
+
+    def lookup(self, now_time: time) -> Tuple[str, ...]:
+        return self.buckets[bisect_right(self.bounds, _seconds_of_day(now_time)) - 1]
 
 
 class ConfigManager:
-    def __init__(self):
+    def __init__(self, save_delay: float = 1.0, storage: str = "json"):
         # 获取当前插件的数据目录
         self.data_dir = store.get_plugin_data_dir()
-
-        # 拼接文件路径
-        self.reco_file = self.data_dir / "reco_config.json"
-        self.group_file = self.data_dir / "group_config.json"
         self.cute_file = self.data_dir / "cute_messages.json"
 
         self.reco_data: Dict[str, RecoItem] = {}
         self.group_data: Dict[str, GroupSettings] = {}
         self.cute_config: list = []
+        self.cute_index = CuteIndex([])
+
+        # 上次加载/写入时各条目的原始内容，用于判断哪些条目需要重新校验
+        self.mtimes: Dict[Path, Optional[float]] = {}
+        self._raw_reco: Dict[str, Any] = {}
+        self._raw_group: Dict[str, Any] = {}
+        # 保存延迟合并写入，避免频繁的 sub/unsub 阻塞事件循环
+        self.writer = WriteBehind(save_delay)
+        self.storage = self._make_storage(storage)
 
         self.load_all()
 
+    def _make_storage(self, backend: str) -> Storage:
+        json_storage = JsonStorage(self.data_dir, self.writer)
+        if backend == "sqlite":
+            # 首次切换到 SQLite 时自动导入现有的 JSON 配置
+            return SqliteStorage(self.data_dir / "config.db", self.writer, json_storage)
+        if backend != "json":
+            logger.warning(f"[QQMusicReco] 未知的存储后端 '{backend}'，将使用 json")
+        return json_storage
+
+    @property
+    def reco_file(self) -> Optional[Path]:
+        return getattr(self.storage, "reco_file", None)
+
+    @property
+    def group_file(self) -> Optional[Path]:
+        return getattr(self.storage, "group_file", None)
+
+    file_mtime = staticmethod(file_mtime)
+
+    def changed_files(self) -> List[Path]:
+        """返回自上次加载/写入后被外部修改过的配置文件"""
+        changed = self.storage.changed_files()
+        if self.file_mtime(self.cute_file) != self.mtimes.get(self.cute_file):
+            changed.append(self.cute_file)
+        return changed
+
+    def set_cute_config(self, cute_config: list):
+        self.cute_config = cute_config
+        self.cute_index = CuteIndex(cute_config)
+
     def load_cute_messages(self) -> list:
-        if not self.cute_file.exists():
+        self.mtimes[self.cute_file] = self.file_mtime(self.cute_file)
+        if self.mtimes[self.cute_file] is None:
             return []
         try:
             with open(self.cute_file, "r", encoding="utf-8") as f:
@@ -48,64 +111,96 @@ class ConfigManager:
             logger.error(f"[QQMusicReco] 加载自定义话术失败: {e}")
             return []
 
-    def load_all(self):
-        # 1. 加载推荐配置
-        if not self.reco_file.exists():
-            init_reco = {
-                "Default": {
-                    "creator": None,
-                    "playlists": ["https://y.qq.com/n/ryqq_v2/playlist/7671500210|1"],
-                }
-            }
-            self._save_json(self.reco_file, init_reco)
-
+    def load_reco(self) -> Optional[set]:
+        """加载推荐配置，只重新校验内容有变化的条目；返回变化的推荐名，失败时返回 None"""
         try:
-            with open(self.reco_file, "r", encoding="utf-8") as f:
-                raw_reco = json.load(f)
-                self.reco_data = {k: RecoItem(**v) for k, v in raw_reco.items()}
+            raw_reco = self.storage.load_reco()
+            self.reco_data, changed = self._merge(raw_reco, self._raw_reco, self.reco_data, RecoItem)
+            self._raw_reco = raw_reco
+            return changed
         except Exception as e:
-            logger.error(f"[QQMusicReco] ❌ 加载推荐配置(reco_config.json)失败: {e}。将保留内存中的旧配置。")
+            logger.error(f"[QQMusicReco] ❌ 加载推荐配置失败: {e}。将保留内存中的旧配置。")
             # 不进行重置，防止文件损坏导致数据清空
+            return None
 
-        # 2. 加载群订阅配置
-        if not self.group_file.exists():
-            self._save_json(self.group_file, {})
-
+    def load_groups(self) -> Optional[set]:
+        """加载群订阅配置，只重新校验内容有变化的条目；返回变化的群号，失败时返回 None"""
         try:
-            with open(self.group_file, "r", encoding="utf-8") as f:
-                raw_group = json.load(f)
-                self.group_data = {gid: GroupSettings(**s) for gid, s in raw_group.items()}
+            raw_group = self.storage.load_groups()
+            self.group_data, changed = self._merge(raw_group, self._raw_group, self.group_data, GroupSettings)
+            self._raw_group = raw_group
+            return changed
         except Exception as e:
-            logger.error(f"[QQMusicReco] ❌ 加载群配置(group_config.json)失败: {e}。将保留内存中的旧配置。")
+            logger.error(f"[QQMusicReco] ❌ 加载群配置失败: {e}。将保留内存中的旧配置。")
             # 不进行重置
-
+            return None
+
+    @staticmethod
+    def _merge(raw: Dict[str, Any], old_raw: Dict[str, Any], old: Dict[str, BaseModel], model):
+        # 先全部校验成功再替换，任何一条出错都保留旧配置
+        result, changed = {}, set()
+        for key, value in raw.items():
+            if key in old and old_raw.get(key) == value:
+                result[key] = old[key]
+            else:
+                result[key] = model(**value)
+                changed.add(key)
+        changed.update(k for k in old if k not in raw)
+        return result, changed
+
+    def load_all(self) -> set:
+        """重新加载全部配置，返回内容有变化的推荐名"""
+        # 1. 加载推荐配置
+        changed_reco = self.load_reco() or set()
+        # 2. 加载群订阅配置
+        self.load_groups()
         # 3. 加载自定义话术
-        self.cute_config = self.load_cute_messages()
+        self.set_cute_config(self.load_cute_messages())
         logger.info(f"[QQMusicReco] 配置加载完成: {len(self.group_data)} 个群订阅, {len(self.reco_data)} 个推荐单。")
+        return changed_reco
+
+    def _saved(self, raw_attr: str):
+        # 写入完成后同步原始内容，之后重载时未变化的条目不会被当成修改
+        def update(rows: Dict[str, Any], full: bool):
+            raw = {} if full else dict(getattr(self, raw_attr))
+            for key, value in rows.items():
+                if value is None:
+                    raw.pop(key, None)
+                else:
+                    raw[key] = value
+            setattr(self, raw_attr, raw)
+        return update
+
+    def save_reco(self, names: Optional[Iterable[str]] = None):
+        """保存推荐配置；names 为 None 时整体写入，否则只写入(或删除)这些条目"""
+        self.storage.write_reco(lambda: self.reco_data, names, self._saved("_raw_reco"))
 
-    def _save_json(self, file_path, data):
-        def to_dict(obj):
-            if hasattr(obj, "model_dump"): return obj.model_dump()
-            if hasattr(obj, "dict"): return obj.dict()
-            return obj
+    def save_group(self, gids: Optional[Iterable[str]] = None):
+        """保存群订阅；gids 为 None 时整体写入，否则只写入(或删除)这些群"""
+        self.storage.write_groups(lambda: self.group_data, gids, self._saved("_raw_group"))
 
-        serializable = {k: to_dict(v) for k, v in data.items()}
-        file_path.parent.mkdir(parents=True, exist_ok=True)
+    def set_group(self, setting: GroupSettings):
+        self.group_data[setting.group_id] = setting
+        self.save_group([setting.group_id])
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(serializable, f, indent=2, ensure_ascii=False)
+    def remove_group(self, group_id: str) -> bool:
+        if self.group_data.pop(group_id, None) is None:
+            return False
+        self.save_group([group_id])
+        return True
 
-    def save_reco(self):
-        self._save_json(self.reco_file, self.reco_data)
+    async def flush(self):
+        await self.writer.flush()
 
-    def save_group(self):
-        self._save_json(self.group_file, self.group_data)
+    async def close(self):
+        await self.flush()
+        self.storage.close()
 
     def add_reco(self, name: str, playlists: List[str], creator: str):
         if name in self.reco_data:
             return False
         self.reco_data[name] = RecoItem(creator=creator, playlists=playlists)
-        self.save_reco()
+        self.save_reco([name])
         return True
 
     def del_reco(self, name: str, user_id: str, is_admin: bool):
@@ -115,40 +210,23 @@ class ConfigManager:
         if not is_admin and item.creator and item.creator != str(user_id):
             return f"❌ 推荐名 '{name}' 由 {item.creator} 创建，你无权删除。"
         del self.reco_data[name]
-        self.save_reco()
+        self.save_reco([name])
         return f"✅ 已删除推荐配置: {name}"
 
     def pick_cute_message(self, now: datetime = None) -> Optional[str]:
         """根据当前时间段选择并随机返回一条话术"""
-        if not self.cute_config:
-            self.cute_config = self.load_cute_messages()
-            if not self.cute_config:
-                return None
+        # 文件被修改(或新建/删除)后才重新读取
+        if self.file_mtime(self.cute_file) != self.mtimes.get(self.cute_file):
+            self.set_cute_config(self.load_cute_messages())
 
         if now is None:
             now = datetime.now()
-        now_time = now.time()
-
-        candidates = []
-        for item in self.cute_config:
-            try:
-                st = time.fromisoformat(item["start_time"])
-                et = time.fromisoformat(item["end_time"])
-                in_range = False
-                if st <= et:
-                    in_range = st <= now_time < et
-                else:
-                    # 跨天
-                    in_range = now_time >= st or now_time < et
-
-                if in_range:
-                    candidates.extend(item.get("messages", []))
-            except Exception as e:
-                logger.warning(f"[QQMusicReco] 话术时间解析错误: {e}")
 
+        candidates = self.cute_index.lookup(now.time())
         if candidates:
             return random.choice(candidates)
         return None
 
 
-manager = ConfigManager()
\ No newline at end of file
+_config = get_plugin_config(Config)
+manager = ConfigManager(_config.qqmusic_save_delay, _config.qqmusic_storage)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+# 各阶段耗时直方图的桶上界(秒)，最后隐含一个 +Inf
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageStats:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics:
+    """进程内的阶段耗时与错误计数。
+
+    阶段：fetch(HTTP 请求)、parse(解析响应)、sample(抽样)、format(生成消息)、send(发送一条消息)、
+    slot(一个时间槽的完整推送)；错误按 (阶段, 异常类型) 计数。
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+        self.errors: Counter = Counter()
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+        stats.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """记录代码块耗时；块内抛出的异常同时计入错误计数"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def error(self, stage: str, exc: BaseException):
+        self.errors[(stage, type(exc).__name__)] += 1
+
+    def reset(self):
+        self.stages.clear()
+        self.errors.clear()
+        self.started_at = time.time()
+
+    def summary(self) -> List[str]:
+        lines = [
+            f"{name}: {st.count} 次，平均 {st.avg * 1000:.1f}ms，最大 {st.max * 1000:.1f}ms"
+            for name, st in sorted(self.stages.items())
+        ]
+        if self.errors:
+            lines.append("错误：" + "，".join(
+                f"{stage}/{kind} ×{n}" for (stage, kind), n in sorted(self.errors.items())
+            ))
+        return lines
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + inner + "}"
+
+
+# (指标名, 类型, 说明, [(标签, 值), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+def prometheus_text(metrics: Metrics, extra: List[Family] = ()) -> str:
+    """按 Prometheus 文本格式导出"""
+    out: List[str] = [
+        "# HELP qqmusic_reco_stage_seconds Time spent per stage.",
+        "# TYPE qqmusic_reco_stage_seconds histogram",
+    ]
+    for name, st in sorted(metrics.stages.items()):
+        cumulative = 0
+        for bound, n in zip((*BUCKETS, "+Inf"), st.buckets):
+            cumulative += n
+            out.append(f"qqmusic_reco_stage_seconds_bucket{_labels({'stage': name, 'le': bound})} {cumulative}")
+        out.append(f"qqmusic_reco_stage_seconds_sum{_labels({'stage': name})} {st.total}")
+        out.append(f"qqmusic_reco_stage_seconds_count{_labels({'stage': name})} {st.count}")
+
+    out.append("# HELP qqmusic_reco_errors_total Errors by stage and exception type.")
+    out.append("# TYPE qqmusic_reco_errors_total counter")
+    for (stage, kind), n in sorted(metrics.errors.items()):
+        out.append(f"qqmusic_reco_errors_total{_labels({'stage': stage, 'type': kind})} {n}")
+
+    for name, kind, help_text, samples in extra:
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            out.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
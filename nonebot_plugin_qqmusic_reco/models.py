@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from nonebot import logger
+from pydantic import BaseModel
+
+
+class RecoItem(BaseModel):
+    creator: Optional[str] = None
+    playlists: List[Union[str, Dict[str, Any]]]
+
+
+class GroupSettings(BaseModel):
+    group_id: str
+    enable: bool = True
+    reco_name: str = "Default"
+    timer_mode: str = "cron"
+    timer_value: str = "8,10,12,14,18,22,0"
+    output_n: int = 3
+    # 定时推送去重：不重复最近 history_n 首 / 最近 history_days 天推送过的歌曲，均为 0 时关闭
+    history_n: int = 0
+    history_days: float = 0
+
+
+# ("cron", 小时, 分钟) 或 ("interval", 分钟数, 0)
+SlotKey = Tuple[str, int, int]
+
+
+def parse_slots(setting: GroupSettings) -> List[SlotKey]:
+    """把群的定时设置解析为时间槽，格式错误的时间点会被跳过"""
+    gid = setting.group_id
+    if setting.timer_mode == "cron":
+        # 支持 timer_value: "8,12,16:30,20,0"
+        raw_times = str(setting.timer_value).replace("，", ",")  # 兼容中文逗号
+        time_points = [t.strip() for t in raw_times.split(",") if t.strip()]
+
+        slots = []
+        for t in time_points:
+            try:
+                if ":" in t:
+                    hour_str, minute_str = t.split(":", 1)
+                    hour = int(hour_str)
+                    minute = int(minute_str)
+                else:
+                    hour = int(t)
+                    minute = 0
+            except ValueError:
+                logger.error(f"[QQMusicReco] 群 {gid} 定时格式错误: '{t}'，已跳过")
+                continue
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                logger.error(f"[QQMusicReco] 群 {gid} 定时超出范围: '{t}'，已跳过")
+                continue
+            slots.append(("cron", hour, minute))
+        return list(dict.fromkeys(slots))
+
+    # interval 模式
+    try:
+        minutes = int(setting.timer_value)
+    except Exception:
+        logger.warning(f"interval 配置格式错误: {setting.timer_value}")
+        return []
+    if minutes <= 0:
+        logger.warning(f"interval 配置格式错误: {setting.timer_value}")
+        return []
+    return [("interval", minutes, 0)]
@@ -0,0 +1,95 @@
+import os
+import asyncio
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from nonebot import logger
+
+from .metrics import metrics
+
+
+def atomic_write_text(path: Path, text: str):
+    """先写临时文件并 fsync，再原子替换目标文件，写到一半崩溃也不会损坏原文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+    # 持久化目录项本身(仅 POSIX 支持对目录 fsync)
+    if os.name == "posix":
+        fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# prepare 在事件循环线程中调用，负责拍快照并返回真正要在线程里执行的写入函数
+Prepare = Callable[[], Callable[[], Any]]
+Done = Optional[Callable[[Any], None]]
+
+
+class WriteBehind:
+    """延迟合并写入：delay 秒内对同一个 key 的多次保存只落盘最后一次，写入在线程池中进行"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._jobs: Dict[Hashable, Tuple[Prepare, Done]] = {}
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def schedule(self, key: Hashable, prepare: Prepare, done: Done = None):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有事件循环(如插件加载阶段)时直接同步写入
+            result = prepare()()
+            if done is not None:
+                done(result)
+            return
+
+        self._jobs[key] = (prepare, done)
+        if self.delay <= 0:
+            self._start()
+        elif self._handle is None and self._task is None:
+            self._handle = loop.call_later(self.delay, self._start)
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def _start(self):
+        self._handle = None
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        try:
+            await self.flush()
+        finally:
+            self._task = None
+
+    async def flush(self):
+        """立即写出所有待写入的内容"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._lock is None:
+            # 延迟到事件循环中创建，兼容 Python 3.9 的 Lock 绑定 loop 行为
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self._jobs:
+                jobs, self._jobs = self._jobs, {}
+                for prepare, done in jobs.values():
+                    try:
+                        result = await asyncio.to_thread(prepare())
+                    except Exception as e:
+                        metrics.error("save", e)
+                        logger.error(f"[QQMusicReco] ❌ 保存配置失败: {e}")
+                        continue
+                    if done is not None:
+                        done(result)
@@ -0,0 +1,335 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from nonebot import get_bots, logger
+from nonebot_plugin_apscheduler import scheduler
+
+from .config import Config
+from .data_source import QQMusicReco
+from .history import SongHistory, song_key
+from .manager import ConfigManager
+from .metrics import metrics
+from .render import Rendered
+from .models import GroupSettings, SlotKey, parse_slots
+from .sampler import SamplingIndex
+from .sender import OutboundSender
+
+JOB_PREFIX = "reco_push_"
+PREWARM_PREFIX = "reco_prewarm_"
+
+# 预热结果：(推荐名, 数量, 消息, 需要记入推送历史的歌曲哈希)
+Warmed = Tuple[str, int, Rendered, Tuple[int, ...]]
+
+
+def slot_job_id(slot: SlotKey) -> str:
+    mode, a, b = slot
+    if mode == "cron":
+        return f"{JOB_PREFIX}cron_{a:02d}{b:02d}"
+    return f"{JOB_PREFIX}interval_{a}"
+
+
+def prewarm_job_id(slot: SlotKey) -> str:
+    _, a, b = slot
+    return f"{PREWARM_PREFIX}{a:02d}{b:02d}"
+
+
+class PushScheduler:
+    """按时间槽调度推送：每个 (时, 分) 或间隔只注册一个任务，触发时扇出到该槽内的所有群"""
+
+    def __init__(self, config: Config, service: QQMusicReco, manager: ConfigManager, sender: OutboundSender,
+                 history: Optional[SongHistory] = None):
+        self.config = config
+        self.service = service
+        self.manager = manager
+        self.sender = sender
+        self.history = history
+        self.slots: Dict[SlotKey, Set[str]] = {}
+        self.group_slots: Dict[str, Set[SlotKey]] = {}
+        # 预热结果：时间槽 -> {群号: Warmed}
+        self.warmed: Dict[SlotKey, Dict[str, Warmed]] = {}
+
+    def refresh(self) -> Tuple[int, int, int]:
+        """全量对账：按当前群配置计算期望的时间槽，只增删/改期有变化的任务"""
+        logger.debug(f"[QQMusicReco] 正在刷新定时任务... 当前系统时间: {datetime.now()}")
+
+        # 1. 重新计算每个时间槽包含的群
+        slots: Dict[SlotKey, Set[str]] = {}
+        group_slots: Dict[str, Set[SlotKey]] = {}
+        for gid, setting in self.manager.group_data.items():
+            own = self._slots_of(setting)
+            if own:
+                group_slots[gid] = own
+            for slot in own:
+                slots.setdefault(slot, set()).add(gid)
+        # 槽内成员在触发时才读取，直接替换即可，无需动任务
+        self.slots = slots
+        self.group_slots = group_slots
+
+        # 2. 与调度器中已有的任务做差异
+        desired = {}
+        for slot in slots:
+            desired.update(self._jobs_for(slot))
+        added = removed = rescheduled = 0
+        for job in scheduler.get_jobs():
+            if not job.id.startswith((JOB_PREFIX, PREWARM_PREFIX)):
+                continue
+            spec = desired.pop(job.id, None)
+            if spec is None:
+                job.remove()
+                removed += 1
+                continue
+            trigger = spec[1]
+            if str(job.trigger) != str(trigger):
+                job.reschedule(trigger)
+                rescheduled += 1
+
+        for job_id, (func, trigger, slot) in desired.items():
+            self._add_job(job_id, func, trigger, slot)
+            added += 1
+
+        logger.info(
+            f"[QQMusicReco] 定时任务加载完毕，共 {len(slots)} 个时间槽，"
+            f"{sum(len(g) for g in slots.values())} 个群推送点"
+            f"（新增 {added}，移除 {removed}，改期 {rescheduled}）。"
+        )
+        return added, removed, rescheduled
+
+    def sync_groups(self, gids: Iterable[str]) -> Tuple[int, int]:
+        """增量更新：只重新计算指定群的时间槽，返回 (新增任务数, 移除任务数)"""
+        added = removed = 0
+        for gid in gids:
+            old = self.group_slots.pop(gid, set())
+            setting = self.manager.group_data.get(gid)
+            new = self._slots_of(setting) if setting else set()
+            if new:
+                self.group_slots[gid] = new
+
+            for slot in old - new:
+                members = self.slots.get(slot)
+                if members is None:
+                    continue
+                members.discard(gid)
+                if not members:
+                    del self.slots[slot]
+                    self.warmed.pop(slot, None)
+                    for job_id in self._jobs_for(slot):
+                        job = scheduler.get_job(job_id)
+                        if job:
+                            job.remove()
+                            removed += 1
+
+            for slot in new - old:
+                members = self.slots.setdefault(slot, set())
+                if not members:
+                    for job_id, (func, trigger, _) in self._jobs_for(slot).items():
+                        self._add_job(job_id, func, trigger, slot)
+                        added += 1
+                members.add(gid)
+
+        if added or removed:
+            logger.debug(f"[QQMusicReco] 增量更新定时任务: 新增 {added}，移除 {removed}")
+        return added, removed
+
+    def invalidate_warmed(self, reco_names: Optional[Iterable[str]] = None):
+        """推荐配置变化后，丢弃基于旧配置预热的消息；不指定推荐名时全部丢弃"""
+        if reco_names is None:
+            self.warmed.clear()
+            return
+        names = set(reco_names)
+        for warmed in self.warmed.values():
+            for gid in [g for g, w in warmed.items() if w[0] in names]:
+                del warmed[gid]
+
+    @staticmethod
+    def _slots_of(setting: GroupSettings) -> Set[SlotKey]:
+        return set(parse_slots(setting)) if setting.enable else set()
+
+    @staticmethod
+    def _trigger(slot: SlotKey):
+        mode, a, b = slot
+        if mode == "cron":
+            return CronTrigger(hour=a, minute=b, timezone=scheduler.timezone)
+        return IntervalTrigger(minutes=a, timezone=scheduler.timezone)
+
+    def _prewarm_trigger(self, slot: SlotKey):
+        _, a, b = slot
+        at = (a * 3600 + b * 60 - self.config.qqmusic_prewarm_seconds) % 86400
+        return CronTrigger(hour=at // 3600, minute=at % 3600 // 60, second=at % 60, timezone=scheduler.timezone)
+
+    def _jobs_for(self, slot: SlotKey) -> Dict[str, tuple]:
+        """时间槽对应的任务：{任务ID: (函数, 触发器, 时间槽)}；cron 槽可附带一个预热任务"""
+        jobs = {slot_job_id(slot): (self.run_slot, self._trigger(slot), slot)}
+        if slot[0] == "cron" and self.config.qqmusic_prewarm_seconds > 0:
+            jobs[prewarm_job_id(slot)] = (self.prewarm_slot, self._prewarm_trigger(slot), slot)
+        return jobs
+
+    def _add_job(self, job_id: str, func, trigger, slot: SlotKey):
+        scheduler.add_job(
+            func,
+            trigger=trigger,
+            id=job_id,
+            args=[slot],
+            misfire_grace_time=60,
+            replace_existing=True,
+        )
+        logger.debug(f"[QQMusicReco] 添加任务: 时间槽[{self.describe(slot)}] ID[{job_id}]")
+
+    @staticmethod
+    def describe(slot: SlotKey) -> str:
+        mode, a, b = slot
+        return f"{a:02d}:{b:02d}" if mode == "cron" else f"每 {a} 分钟"
+
+    def _due(self, slot: SlotKey) -> List[GroupSettings]:
+        return [
+            s for s in (self.manager.group_data.get(g) for g in sorted(self.slots.get(slot, ())))
+            if s and s.enable
+        ]
+
+    async def prewarm_slot(self, slot: SlotKey):
+        """在时间槽触发前拉取/刷新歌单并生成各群的推荐消息，触发时直接发送"""
+        settings = self._due(slot)
+        self.warmed.pop(slot, None)
+        if not settings:
+            return
+
+        prepared: Dict[str, asyncio.Future] = {}
+        for s in settings:
+            self._prepare(s.reco_name, prepared, wait_stale=True)
+        await asyncio.gather(*prepared.values(), return_exceptions=True)
+
+        warmed: Dict[str, Warmed] = {}
+        for s in settings:
+            fut = prepared.get(s.reco_name)
+            if fut is None:
+                continue
+            if fut.exception() is not None:
+                metrics.error("prewarm", fut.exception())
+                logger.warning(f"[QQMusicReco] 预热推荐配置 {s.reco_name} 失败: {fut.exception()}")
+                continue
+            msg, keys = await self._compose(s, fut.result())
+            warmed[s.group_id] = (s.reco_name, s.output_n, msg, keys)
+
+        self.warmed[slot] = warmed
+        logger.debug(f"[QQMusicReco] 时间槽 {self.describe(slot)} 预热完成，{len(warmed)}/{len(settings)} 个群")
+
+    async def run_slot(self, slot: SlotKey):
+        warmed = self.warmed.pop(slot, {})
+        settings = self._due(slot)
+        if not settings:
+            return
+
+        bots = get_bots()
+        if not bots:
+            logger.warning(f"[QQMusicReco] 定时任务触发({self.describe(slot)}，{len(settings)} 个群)，但没有连接的 Bot")
+            return
+
+        mode, a, b = slot
+        trigger_time = None
+        if mode == "cron":
+            # 构造当前触发的时间点用于判断文案区间
+            trigger_time = datetime.now().replace(hour=a, minute=b, second=0, microsecond=0)
+
+        # 同一推荐配置在本槽内只拉取/编译一次
+        prepared: Dict[str, asyncio.Future] = {}
+        sem = asyncio.Semaphore(max(1, self.config.qqmusic_push_concurrency))
+        spread = max(0.0, self.config.qqmusic_push_spread)
+        step = spread / len(settings) if len(settings) > 1 else 0.0
+
+        with metrics.timer("slot"):
+            await asyncio.gather(*(
+                self._push_group(s, bots, trigger_time, prepared, sem, i * step, warmed.get(s.group_id))
+                for i, s in enumerate(settings)
+            ))
+        logger.info(f"[QQMusicReco] 时间槽 {self.describe(slot)} 推送完成，共 {len(settings)} 个群")
+
+    def _prepare(self, reco_name: str, prepared: Dict[str, asyncio.Future],
+                 wait_stale: bool = False) -> Optional[asyncio.Future]:
+        fut = prepared.get(reco_name)
+        if fut is None:
+            reco_config = self.manager.reco_data.get(reco_name)
+            if not reco_config:
+                return None
+            fut = prepared[reco_name] = asyncio.ensure_future(
+                self.service.prepare(reco_config.playlists, wait_stale=wait_stale)
+            )
+        return fut
+
+    async def _push_group(self, s: GroupSettings, bots: dict, trigger_time: Optional[datetime],
+                          prepared: Dict[str, asyncio.Future], sem: asyncio.Semaphore, delay: float,
+                          warmed: Optional[Warmed] = None):
+        # 把同一槽内的群错开发送，避免瞬间冲击 OneBot 连接
+        if delay:
+            await asyncio.sleep(delay)
+
+        g_id = s.group_id
+        async with sem:
+            # 获取自定义文案
+            cute_msg = None
+            if self.config.qqmusic_cute_message:
+                try:
+                    cute_msg = self.manager.pick_cute_message(now=trigger_time)
+                except Exception as e:
+                    metrics.error("cute", e)
+                    logger.warning(f"[QQMusicReco] 获取文案失败: {e}")
+
+            await_msg = cute_msg if cute_msg else "让我思考一下推荐什么喵..."
+
+            # 多个 Bot 推送到同一个群时，推送历史只按群记录一次
+            pushed: Dict[int, None] = {}
+            for bot in bots.values():
+                sends: List[asyncio.Future] = []
+                try:
+                    # 1. 发送提示语（进入限速队列，同群消息保证顺序）
+                    sends.append(self.sender.send_group(bot, g_id, await_msg))
+
+                    # 2. 获取并发送歌曲；预热过且配置未变时直接使用预生成的消息
+                    if (warmed and warmed[:2] == (s.reco_name, s.output_n)
+                            and s.reco_name in self.manager.reco_data):
+                        sends.extend(self.sender.send_group(bot, g_id, m) for m in warmed[2])
+                        keys, warmed = warmed[3], None
+                        await self._wait_sent(sends)
+                        pushed.update(dict.fromkeys(keys))
+                        continue
+
+                    fut = self._prepare(s.reco_name, prepared)
+                    if fut is None:
+                        sends.append(self.sender.send_group(bot, g_id, f"❌ 找不到推荐配置: {s.reco_name}"))
+                        await self._wait_sent(sends)
+                        break
+
+                    index: SamplingIndex = await asyncio.shield(fut)
+                    msg, keys = await self._compose(s, index)
+                    sends.extend(self.sender.send_group(bot, g_id, m) for m in msg)
+                    await self._wait_sent(sends)
+                    pushed.update(dict.fromkeys(keys))
+                    logger.debug(f"[QQMusicReco] 群 {g_id} 定时推送完成")
+                except Exception as e:
+                    metrics.error("push", e)
+                    logger.warning(f"[QQMusicReco] 群 {g_id} 推送异常: {type(e).__name__}: {e}")
+            await self._record(s, tuple(pushed))
+
+    async def _compose(self, s: GroupSettings, index: SamplingIndex) -> Tuple[Rendered, Tuple[int, ...]]:
+        """为群生成推荐消息；开启去重时跳过最近推送过的歌曲，并返回本次歌曲的哈希"""
+        seen = await self.history.seen(s) if self.history is not None else None
+        if seen is None:
+            return self.service.render(index, s.output_n), ()
+        # 没有 songmid 的歌曲无法去重，始终可选
+        exclude = (lambda song: bool(song.mid) and song_key(song.mid) in seen) if seen else None
+        picked = self.service.pick(index, s.output_n, exclude=exclude)
+        keys = tuple(song_key(song.mid) for song in picked or () if song.mid)
+        return self.service.format_songs(picked), keys
+
+    async def _record(self, s: GroupSettings, keys: Tuple[int, ...]):
+        if keys and self.history is not None:
+            await self.history.record(s, keys)
+
+    @staticmethod
+    async def _wait_sent(sends: List[asyncio.Future]):
+        # 等全部消息出队，取出所有异常避免 "never retrieved" 警告，再抛出第一个
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for r in results:
+            if isinstance(r, BaseException):
+                raise r
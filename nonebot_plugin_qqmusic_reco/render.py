@@ -0,0 +1,74 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Bot, MessageSegment
+
+from .song import Song
+
+# 一次推荐要依次发送的消息：str / MessageSegment / ForwardMessage
+Rendered = List[Any]
+Renderer = Callable[[List[Song]], Rendered]
+
+FORWARD_NICKNAME = "QQ音乐推荐"
+
+
+class ForwardMessage:
+    """合并转发消息，发送时调用 send_group_forward_msg / send_private_forward_msg"""
+
+    __slots__ = ("contents",)
+
+    def __init__(self, contents: List[str]):
+        self.contents = contents
+
+    def nodes(self, self_id: str) -> List[MessageSegment]:
+        return [
+            MessageSegment.node_custom(user_id=int(self_id), nickname=FORWARD_NICKNAME, content=c)
+            for c in self.contents
+        ]
+
+    def __str__(self) -> str:
+        return "\n".join(self.contents)
+
+
+def render_text(picked: List[Song]) -> Rendered:
+    # 每首歌的内容在歌曲对象上只生成一次，这里只拼接序号
+    return ["\n".join(f"{i}. {s.line}" for i, s in enumerate(picked, 1))]
+
+
+def render_card(picked: List[Song]) -> Rendered:
+    # 音乐卡片只能单独成一条消息；接口没有返回 songid 的歌曲退回文本
+    return [MessageSegment.music("qq", s.songid) if s.songid else f"{i}. {s.line}" for i, s in enumerate(picked, 1)]
+
+
+def render_forward(picked: List[Song]) -> Rendered:
+    return [ForwardMessage([f"{i}. {s.line}" for i, s in enumerate(picked, 1)])]
+
+
+RENDERERS: Dict[str, Renderer] = {
+    "text": render_text,
+    "card": render_card,
+    "forward": render_forward,
+}
+
+
+def get_renderer(name: str) -> Renderer:
+    renderer = RENDERERS.get(name)
+    if renderer is None:
+        logger.warning(f"[QQMusicReco] 未知的输出格式 {name}，使用 text（可选：{', '.join(RENDERERS)}）")
+        renderer = render_text
+    return renderer
+
+
+def render_songs(renderer: Renderer, picked: Optional[List[Song]]) -> Rendered:
+    if picked is None:
+        return ["❌ 无法获取歌曲数据，请检查歌单配置。"]
+    if not picked:
+        return ["❌ 有效歌单为空。"]
+    return renderer(picked)
+
+
+async def send_group(bot: Bot, group_id: int, message: Any):
+    if isinstance(message, ForwardMessage):
+        await bot.send_group_forward_msg(group_id=group_id, messages=message.nodes(bot.self_id))
+    else:
+        await bot.send_group_msg(group_id=group_id, message=message)
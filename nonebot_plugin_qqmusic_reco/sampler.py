@@ -0,0 +1,249 @@
+import math
+import random
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+
+class FenwickTree:
+    """按来源权重做前缀和，支持 O(log n) 的加权抽取与单点修改"""
+
+    __slots__ = ("n", "tree")
+
+    def __init__(self, weights: Sequence[float]):
+        self.n = len(weights)
+        self.tree = [0.0] * (self.n + 1)
+        for i, w in enumerate(weights):
+            self.add(i, w)
+
+    def add(self, i: int, delta: float):
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self) -> float:
+        s, i = 0.0, self.n
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
+        return s
+
+    def find(self, target: float) -> int:
+        """返回前缀和首次超过 target 的下标"""
+        pos, step = 0, 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return min(pos, self.n - 1)
+
+
+class SamplingIndex:
+    """一个推荐配置(若干歌单 + 权重)编译后的抽样结构。
+
+    只保存对缓存歌单列表的引用，不复制歌曲；歌单刷新或配置变化后重新构建。
+    抽样语义与逐首抽取完全一致：
+    1. 总数超过 max_pool 时，先从全部歌曲中等概率抽出 max_pool 首作为歌曲池
+    2. 每首按来源权重选歌单，再从该歌单在池中剩余的歌曲里等概率取一首（不放回）
+    """
+
+    __slots__ = ("ids", "weights", "songs", "offsets", "total", "_refs")
+
+    def __init__(self, specs: Sequence[Tuple[str, float]], lists: Sequence[Optional[List]]):
+        self._refs = tuple(lists)
+        self.ids: List[str] = []
+        self.weights: List[float] = []
+        self.songs: List[List] = []
+
+        # 同一歌单在配置中出现多次时，歌曲重复计入、权重以最后一次为准
+        pos = {}
+        for (disstid, weight), songs in zip(specs, lists):
+            if not songs:
+                continue
+            i = pos.get(disstid)
+            if i is None:
+                pos[disstid] = len(self.ids)
+                self.ids.append(disstid)
+                self.weights.append(weight)
+                self.songs.append(songs)
+            else:
+                self.weights[i] = weight
+                self.songs[i] = self.songs[i] + songs
+
+        self.offsets: List[int] = []
+        self.total = 0
+        for songs in self.songs:
+            self.offsets.append(self.total)
+            self.total += len(songs)
+
+    def matches(self, lists: Sequence[Optional[List]]) -> bool:
+        return len(lists) == len(self._refs) and all(a is b for a, b in zip(lists, self._refs))
+
+    def pool_counts(self, max_pool: int, rng=random) -> List[int]:
+        """每个来源进入歌曲池的数量"""
+        if self.total <= max_pool:
+            return [len(s) for s in self.songs]
+        counts = [0] * len(self.songs)
+        for idx in rng.sample(range(self.total), max_pool):
+            counts[bisect_right(self.offsets, idx) - 1] += 1
+        return counts
+
+    def draw(self, output_n: int, max_pool: int, rng=random,
+             exclude: Optional[Callable[[Any], bool]] = None) -> Optional[List]:
+        """抽取歌曲；没有任何歌曲时返回 None，没有正权重来源时返回空列表"""
+        if self.total == 0:
+            return None
+        counts = self.pool_counts(max_pool, rng)
+        return pick_weighted(self.songs, counts, self.weights, output_n, rng, exclude)
+
+
+def pick_weighted(songs: Sequence[Sequence], counts: List[int], weights: Sequence[float],
+                  output_n: int, rng=random, exclude: Optional[Callable[[Any], bool]] = None) -> List:
+    """按来源权重从歌曲池中不放回地抽取 output_n 首。
+
+    counts[i] 为来源 i 在池中的歌曲数；songs[i] 可以是该来源的全部歌曲，也可以只是池中的部分，
+    两者在来源内等概率抽取时分布相同。exclude 返回 True 的歌曲(如最近推送过的)会被跳过，
+    全部来源都只剩被排除的歌曲时才用它们补足数量。
+    """
+    live = [c if w > 0 else 0 for c, w in zip(counts, weights)]
+    if not any(live):
+        return []
+    final_n = max(1, min(output_n, sum(counts)))
+
+    if exclude is not None:
+        taken = [set() for _ in songs]
+        picked = _pick_loop(songs, live[:], weights, final_n, rng, taken, exclude)
+        if len(picked) < final_n:
+            remaining = [c - len(t) if c else 0 for c, t in zip(live, taken)]
+            picked += _pick_loop(songs, remaining, weights, final_n - len(picked), rng, taken, None)
+        return picked
+
+    tree = FenwickTree([w if c else 0.0 for c, w in zip(live, weights)])
+    order: List[int] = []
+    for _ in range(final_n):
+        total = tree.total()
+        if total <= 0:
+            break
+        i = tree.find(rng.random() * total)
+        if not live[i]:
+            # 浮点误差落到已耗尽的来源上时退回线性查找
+            i = next(j for j, c in enumerate(live) if c)
+        order.append(i)
+        live[i] -= 1
+        if not live[i]:
+            tree.add(i, -weights[i])
+            if not any(live):
+                break
+
+    # 同一来源内是等概率不放回抽取，等价于一次性 sample 后按顺序分配
+    picks = {}
+    for i in set(order):
+        picks[i] = iter(rng.sample(songs[i], order.count(i)))
+    return [next(picks[i]) for i in order]
+
+
+def _pick_loop(songs: Sequence[Sequence], live: List[int], weights: Sequence[float], n: int, rng,
+               taken: List[Set[int]], exclude: Optional[Callable[[Any], bool]]) -> List:
+    # 逐首选来源后在来源内拒绝抽样；来源里已没有可用歌曲时把它从权重树中移除
+    tree = FenwickTree([w if c else 0.0 for c, w in zip(live, weights)])
+    picked = []
+    while len(picked) < n:
+        total = tree.total()
+        if total <= 0 or not any(live):
+            break
+        i = tree.find(rng.random() * total)
+        if not live[i]:
+            i = next(j for j, c in enumerate(live) if c)
+        song = _pick_fresh(songs[i], taken[i], exclude, rng)
+        if song is not None:
+            picked.append(song)
+            live[i] -= 1
+        else:
+            live[i] = 0
+        if not live[i]:
+            tree.add(i, -weights[i])
+    return picked
+
+
+def _pick_fresh(songs: Sequence, taken: Set[int], exclude: Optional[Callable[[Any], bool]], rng):
+    """在来源内等概率取一首未取过且未被排除的歌曲，没有时返回 None"""
+    n = len(songs)
+    # 被排除的通常只占少数，先随机试几次，不用扫描整个歌单
+    for _ in range(min(n, 16)):
+        j = rng.randrange(n)
+        if j not in taken and (exclude is None or not exclude(songs[j])):
+            taken.add(j)
+            return songs[j]
+    candidates = [j for j in range(n) if j not in taken and (exclude is None or not exclude(songs[j]))]
+    if not candidates:
+        return None
+    j = rng.choice(candidates)
+    taken.add(j)
+    return songs[j]
+
+
+def _open_uniform(rng) -> float:
+    # (0, 1) 区间的随机数，避免对 0 取对数
+    u = rng.random()
+    while u == 0.0:
+        u = rng.random()
+    return u
+
+
+class Reservoir:
+    """流式歌曲池：按到达顺序逐个歌单喂入，始终只保留等概率抽出的 k 首。
+
+    使用 Algorithm L 按跳跃距离直接定位下一首入选的歌曲，整段跳过的歌单不会被逐首遍历；
+    结果与把所有歌曲拼起来打乱后取前 k 首同分布，且与歌单到达的先后顺序无关。
+    """
+
+    __slots__ = ("k", "rng", "items", "seen", "_w", "_next")
+
+    def __init__(self, k: int, rng=random):
+        self.k = max(0, k)
+        self.rng = rng
+        # (来源, 歌曲)
+        self.items: List[Tuple[str, object]] = []
+        self.seen = 0
+        self._w = 1.0
+        self._next = self.k
+        if self.k:
+            self._advance()
+
+    def _advance(self):
+        self._w *= math.exp(math.log(_open_uniform(self.rng)) / self.k)
+        self._next += int(math.log(_open_uniform(self.rng)) / math.log(max(1.0 - self._w, 1e-300)))
+        if self.items:
+            self._next += 1
+
+    def offer(self, source: str, songs: Sequence):
+        n = len(songs)
+        start = self.seen
+        self.seen += n
+        if not self.k:
+            return
+
+        i = 0
+        # 蓄水池未满时直接放入
+        while len(self.items) < self.k and i < n:
+            self.items.append((source, songs[i]))
+            i += 1
+        while self._next < self.seen:
+            self.items[self.rng.randrange(self.k)] = (source, songs[self._next - start])
+            self._advance()
+
+    def draw(self, weights: Dict[str, float], output_n: int,
+             exclude: Optional[Callable[[Any], bool]] = None) -> Optional[List]:
+        """按来源权重从池中抽取；与 SamplingIndex.draw 的返回约定相同"""
+        if self.seen == 0:
+            return None
+        pool: Dict[str, List] = {}
+        for source, song in self.items:
+            pool.setdefault(source, []).append(song)
+        ids = list(pool)
+        return pick_weighted(
+            [pool[d] for d in ids], [len(pool[d]) for d in ids], [weights[d] for d in ids], output_n, self.rng,
+            exclude,
+        )
@@ -0,0 +1,176 @@
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from nonebot import logger
+from nonebot.adapters import Bot
+
+from .config import Config
+from .metrics import metrics
+from .render import send_group
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Outgoing:
+    __slots__ = ("group_id", "message", "future", "enqueued_at")
+
+    def __init__(self, group_id: int, message: Any, future: asyncio.Future):
+        self.group_id = group_id
+        self.message = message
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class BotSendQueue:
+    """单个 Bot 的发送队列。
+
+    每个群一条 FIFO，就绪队列里同一个群最多出现一次，
+    因此多个 worker 并行发送时同一群的消息仍严格按顺序送达。
+    """
+
+    def __init__(self, bot: Bot, config: Config):
+        self.bot = bot
+        self.config = config
+        self.bucket = TokenBucket(config.qqmusic_send_rate, config.qqmusic_send_burst)
+        self._groups: Dict[int, Deque[_Outgoing]] = {}
+        self._ready: "asyncio.Queue[int]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+
+        self.depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def submit(self, group_id: int, message: Any) -> asyncio.Future:
+        if not self._workers:
+            self._workers = [
+                asyncio.ensure_future(self._worker())
+                for _ in range(max(1, self.config.qqmusic_send_workers))
+            ]
+
+        item = _Outgoing(group_id, message, asyncio.get_running_loop().create_future())
+        queue = self._groups.get(group_id)
+        if queue is None:
+            queue = self._groups[group_id] = deque()
+        queue.append(item)
+        if len(queue) == 1:
+            self._ready.put_nowait(group_id)
+        self.depth += 1
+        return item.future
+
+    async def _worker(self):
+        while True:
+            group_id = await self._ready.get()
+            queue = self._groups[group_id]
+            item = queue[0]
+            try:
+                await self._deliver(item)
+            finally:
+                queue.popleft()
+                self.depth -= 1
+                if queue:
+                    self._ready.put_nowait(group_id)
+                else:
+                    del self._groups[group_id]
+
+    async def _deliver(self, item: _Outgoing):
+        attempts = 1 + max(0, self.config.qqmusic_send_retries)
+        for attempt in range(attempts):
+            await self.bucket.acquire()
+            try:
+                with metrics.timer("send"):
+                    await send_group(self.bot, item.group_id, item.message)
+            except Exception as e:
+                if attempt + 1 >= attempts:
+                    self.failed += 1
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                    return
+                self.retries += 1
+                # 指数退避 + 抖动
+                delay = self.config.qqmusic_send_retry_delay * (2 ** attempt)
+                delay += random.uniform(0, delay / 2)
+                logger.debug(f"[QQMusicReco] 群 {item.group_id} 发送失败({e})，{delay:.1f}s 后重试")
+                await asyncio.sleep(delay)
+                continue
+
+            latency = time.monotonic() - item.enqueued_at
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if not item.future.done():
+                item.future.set_result(None)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency_avg": self.latency_total / self.sent if self.sent else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for queue in self._groups.values():
+            for item in queue:
+                if not item.future.done():
+                    item.future.cancel()
+        self._groups.clear()
+        self.depth = 0
+
+
+class OutboundSender:
+    """按 Bot 划分的限速发送队列，供定时推送使用"""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.queues: Dict[str, BotSendQueue] = {}
+
+    def send_group(self, bot: Bot, group_id: int, message: Any) -> asyncio.Future:
+        queue = self.queues.get(bot.self_id)
+        if queue is None:
+            queue = self.queues[bot.self_id] = BotSendQueue(bot, self.config)
+        else:
+            # Bot 重连后是新的实例，沿用原队列即可
+            queue.bot = bot
+        return queue.submit(int(group_id), message)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {self_id: q.stats() for self_id, q in self.queues.items()}
+
+    async def shutdown(self):
+        for queue in self.queues.values():
+            await queue.close()
+        self.queues.clear()
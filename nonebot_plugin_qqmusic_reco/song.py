@@ -0,0 +1,108 @@
+import json
+from typing import Any, Collection, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库
+    orjson = None
+
+
+class Song:
+    """推荐用到的歌曲字段，接口返回的其余字段在解析时直接丢弃"""
+
+    __slots__ = ("name", "mid", "singers", "source_id", "songid", "_line")
+
+    def __init__(self, name: str, mid: str, singers: str, source_id: str, songid: int = 0):
+        self.name = name
+        self.mid = mid
+        self.singers = singers
+        self.source_id = source_id
+        # 数字 id，发送 QQ 音乐卡片时使用；旧版本目录里没有保存，为 0
+        self.songid = songid
+        self._line: Optional[str] = None
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any], source_id: str) -> "Song":
+        singers = " / ".join([str(si.get("name", "未知")) for si in raw.get("singer") or ()])
+        try:
+            songid = int(raw.get("songid") or 0)
+        except (TypeError, ValueError):
+            songid = 0
+        return cls(raw.get("songname", "未知曲目"), raw.get("songmid") or "", singers, source_id, songid)
+
+    @property
+    def line(self) -> str:
+        """文本输出中这首歌的内容(不含序号)；歌曲对象随歌单缓存复用，首次用到时生成后一直保留"""
+        if self._line is None:
+            link = f"https://y.qq.com/n/ryqq/songDetail/{self.mid}" if self.mid else "无需链接"
+            self._line = f"{self.name} - {self.singers}\n   {link}"
+        return self._line
+
+    def __repr__(self) -> str:
+        return f"Song({self.name!r}, {self.mid!r}, {self.singers!r}, {self.source_id!r})"
+
+
+def _projector(source_id: str):
+    # 解码器每构造完一个对象就会调用 object_hook；带 songmid 的歌曲对象在这里立即投影成 Song，
+    # 其下的专辑/付费等字段随即释放，峰值内存只有结果列表加上正在解析的那一首。
+    # 这只是省内存的捷径，songlist 中其余的歌曲在解码后再逐个投影
+    def hook(obj: Dict[str, Any]):
+        if "songmid" in obj:
+            return Song.from_raw(obj, source_id)
+        return obj
+    return hook
+
+
+def _songlist(data: Any) -> List:
+    cdlist = data.get("cdlist") if isinstance(data, dict) else None
+    if cdlist and isinstance(cdlist[0], dict):
+        return cdlist[0].get("songlist") or []
+    return []
+
+
+def parse_with_hook(content: Union[bytes, str], source_id: str) -> List[Song]:
+    if isinstance(content, bytes):
+        content = content.decode("utf-8")
+    songs = _songlist(json.loads(content, object_hook=_projector(source_id)))
+    return [s if isinstance(s, Song) else Song.from_raw(s, source_id) for s in songs if isinstance(s, (Song, dict))]
+
+
+def parse_with_orjson(content: Union[bytes, str], source_id: str) -> List[Song]:
+    # orjson 不支持 object_hook，但解码快得多，解码完再投影
+    return [Song.from_raw(s, source_id) for s in _songlist(orjson.loads(content)) if isinstance(s, dict)]
+
+
+def parse_songlist(content: Union[bytes, str], source_id: str) -> List[Song]:
+    """解析 fcg_ucc_getcdinfo_byids_cp 的响应，返回该歌单的 Song 列表"""
+    if orjson is not None:
+        return parse_with_orjson(content, source_id)
+    return parse_with_hook(content, source_id)
+
+
+def parse_cdlist(content: Union[bytes, str], wanted: Collection[str]) -> Dict[str, List[Song]]:
+    """解析一次请求多个歌单的响应，按 cdlist 中各歌单的 disstid 拆分；不在 wanted 中的歌单忽略"""
+    if orjson is not None:
+        data = orjson.loads(content)
+    else:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        # 解析时还不知道歌曲属于哪个歌单，先投影，拆分时再填上来源
+        data = json.loads(content, object_hook=_projector(""))
+
+    cdlist = data.get("cdlist") if isinstance(data, dict) else None
+    result: Dict[str, List[Song]] = {}
+    for cd in cdlist or ():
+        if not isinstance(cd, dict):
+            continue
+        disstid = str(cd.get("disstid") or "")
+        if disstid not in wanted or disstid in result:
+            continue
+        songs = []
+        for raw in cd.get("songlist") or ():
+            if isinstance(raw, Song):
+                raw.source_id = disstid
+                songs.append(raw)
+            elif isinstance(raw, dict):
+                songs.append(Song.from_raw(raw, disstid))
+        result[disstid] = songs
+    return result
@@ -0,0 +1,248 @@
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from nonebot import logger
+
+from .models import GroupSettings
+from .persist import WriteBehind, atomic_write_text
+
+# 读取当前内存中的完整配置 {键: 模型}
+DataGetter = Callable[[], Dict[str, Any]]
+# 写入完成后的回调：(已写入的行, 是否为整体写入)；值为 None 表示该键已删除
+OnSaved = Optional[Callable[[Dict[str, Any], bool], None]]
+
+DEFAULT_RECO = {
+    "Default": {
+        "creator": None,
+        "playlists": ["https://y.qq.com/n/ryqq_v2/playlist/7671500210|1"],
+    }
+}
+
+
+def to_dict(obj):
+    if hasattr(obj, "model_dump"): return obj.model_dump()
+    if hasattr(obj, "dict"): return obj.dict()
+    return obj
+
+
+def file_mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+class Storage(ABC):
+    """推荐配置与群订阅的存储后端。
+
+    load_* 返回原始 dict，由 ConfigManager 负责校验；write_* 把内存中的当前状态
+    写回，keys 为 None 表示整体写入，否则只需写入(或删除)这些键。
+    """
+
+    def __init__(self, writer: WriteBehind):
+        self.writer = writer
+
+    @abstractmethod
+    def load_reco(self) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def load_groups(self) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def write_reco(self, get_data: DataGetter, keys: Optional[Iterable[str]] = None, on_saved: OnSaved = None):
+        ...
+
+    @abstractmethod
+    def write_groups(self, get_data: DataGetter, keys: Optional[Iterable[str]] = None, on_saved: OnSaved = None):
+        ...
+
+    def changed_files(self) -> List[Path]:
+        """被外部修改、需要热重载的文件"""
+        return []
+
+    def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    """默认后端：reco_config.json / group_config.json，整体写入"""
+
+    def __init__(self, data_dir: Path, writer: WriteBehind):
+        super().__init__(writer)
+        self.reco_file = data_dir / "reco_config.json"
+        self.group_file = data_dir / "group_config.json"
+        # 上次加载/写入时的 mtime，用于判断文件是否被外部修改
+        self.mtimes: Dict[Path, Optional[float]] = {}
+
+    def changed_files(self) -> List[Path]:
+        return [p for p in (self.reco_file, self.group_file) if file_mtime(p) != self.mtimes.get(p)]
+
+    def _load(self, path: Path, default: Dict[str, Any]) -> Dict[str, Any]:
+        if not path.exists():
+            self._write(path, default)
+        self.mtimes[path] = file_mtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_reco(self) -> Dict[str, Any]:
+        return self._load(self.reco_file, DEFAULT_RECO)
+
+    def load_groups(self) -> Dict[str, Any]:
+        return self._load(self.group_file, {})
+
+    def _write(self, path: Path, data: Dict[str, Any]):
+        # 可能在线程中执行：只读快照，不修改实例状态
+        serializable = {k: to_dict(v) for k, v in data.items()}
+        atomic_write_text(path, json.dumps(serializable, indent=2, ensure_ascii=False))
+        return serializable, file_mtime(path)
+
+    def _save_later(self, path: Path, get_data: DataGetter, on_saved: OnSaved):
+        def prepare():
+            # 在事件循环线程中浅拷贝；条目本身只会被整体替换，不会被原地修改
+            snapshot = dict(get_data())
+            return lambda: self._write(path, snapshot)
+
+        def done(result):
+            serializable, mtime = result
+            # 记录自己写入后的 mtime，避免文件监视把自身的写入当成外部修改
+            self.mtimes[path] = mtime
+            if on_saved is not None:
+                on_saved(serializable, True)
+
+        self.writer.schedule(path, prepare, done)
+
+    def write_reco(self, get_data: DataGetter, keys: Optional[Iterable[str]] = None, on_saved: OnSaved = None):
+        self._save_later(self.reco_file, get_data, on_saved)
+
+    def write_groups(self, get_data: DataGetter, keys: Optional[Iterable[str]] = None, on_saved: OnSaved = None):
+        self._save_later(self.group_file, get_data, on_saved)
+
+
+class SqliteStorage(Storage):
+    """SQLite 后端：按行 upsert，群号/推荐名为主键。
+
+    只用于持久化：运行时以内存中的配置为准，按推荐名、推送时间查找群由调度器在内存中完成，
+    因此表中只存主键与 JSON。首次启用时如果数据库为空，会一次性从现有的 JSON 文件导入。
+    """
+
+    def __init__(self, path: Path, writer: WriteBehind, json_storage: Optional[JsonStorage] = None):
+        super().__init__(writer)
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty: Dict[str, Set[str]] = {"reco": set(), "group_settings": set()}
+        self._full: Set[str] = set()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS reco (name TEXT PRIMARY KEY, data TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS group_settings (group_id TEXT PRIMARY KEY, data TEXT NOT NULL);"
+        )
+        self._conn.commit()
+        if json_storage is not None:
+            self.migrate_from_json(json_storage)
+
+    def migrate_from_json(self, source: JsonStorage):
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+            empty = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM reco) + (SELECT COUNT(*) FROM group_settings)"
+            ).fetchone()[0] == 0
+        if done or not empty:
+            return
+
+        reco, groups = {}, {}
+        if source.reco_file.exists():
+            reco = source.load_reco()
+        if source.group_file.exists():
+            groups = source.load_groups()
+        with self._lock, self._conn:
+            for name, value in (reco or DEFAULT_RECO).items():
+                self._upsert_reco(name, value)
+            for gid, value in groups.items():
+                self._upsert_group(gid, to_dict(GroupSettings(**value)))
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', '1')")
+        logger.info(f"[QQMusicReco] 已从 JSON 导入 {len(reco)} 个推荐配置、{len(groups)} 个群订阅到 {self.path.name}")
+
+    def load_reco(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, data FROM reco").fetchall()
+        return {name: json.loads(data) for name, data in rows}
+
+    def load_groups(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT group_id, data FROM group_settings").fetchall()
+        return {gid: json.loads(data) for gid, data in rows}
+
+    def _upsert_reco(self, name: str, value: Optional[Dict[str, Any]]):
+        if value is None:
+            self._conn.execute("DELETE FROM reco WHERE name = ?", (name,))
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reco (name, data) VALUES (?, ?)",
+                (name, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def _upsert_group(self, gid: str, value: Optional[Dict[str, Any]]):
+        if value is None:
+            self._conn.execute("DELETE FROM group_settings WHERE group_id = ?", (gid,))
+        else:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO group_settings (group_id, data) VALUES (?, ?)",
+                (gid, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def _schedule(self, table: str, get_data: DataGetter, keys: Optional[Iterable[str]], on_saved: OnSaved):
+        if keys is None:
+            self._full.add(table)
+        else:
+            self._dirty[table].update(keys)
+
+        def prepare():
+            # 在事件循环线程中取出待写入的行，之后的修改会进入下一批
+            data = get_data()
+            full = table in self._full
+            self._full.discard(table)
+            keys_now = set(data) if full else self._dirty[table]
+            self._dirty[table] = set()
+            rows = {k: (to_dict(data[k]) if k in data else None) for k in keys_now}
+            return lambda: (self._apply(table, rows, full), full)
+
+        def done(result):
+            if on_saved is not None:
+                on_saved(*result)
+
+        self.writer.schedule(("sqlite", table), prepare, done)
+
+    def _apply(self, table: str, rows: Dict[str, Any], full: bool):
+        # 在线程中执行，一批修改放在同一个事务里
+        with self._lock, self._conn:
+            if full:
+                key_col = "name" if table == "reco" else "group_id"
+                existing = {r[0] for r in self._conn.execute(f"SELECT {key_col} FROM {table}")}
+                for k in existing - set(rows):
+                    rows[k] = None
+            for k, value in rows.items():
+                if table == "reco":
+                    self._upsert_reco(k, value)
+                else:
+                    self._upsert_group(k, value)
+        return rows
+
+    def write_reco(self, get_data: DataGetter, keys: Optional[Iterable[str]] = None, on_saved: OnSaved = None):
+        self._schedule("reco", get_data, keys, on_saved)
+
+    def write_groups(self, get_data: DataGetter, keys: Optional[Iterable[str]] = None, on_saved: OnSaved = None):
+        self._schedule("group_settings", get_data, keys, on_saved)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
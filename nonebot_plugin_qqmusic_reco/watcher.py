@@ -0,0 +1,90 @@
+import time
+import asyncio
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from nonebot import logger
+
+from .manager import ConfigManager
+from .metrics import metrics
+
+
+class ConfigWatcher:
+    """轮询配置文件的 mtime，文件被外部修改且稳定 debounce 秒后只重载该文件。
+
+    只依赖标准库；插件自身的写入会同步更新记录的 mtime，不会触发重载。
+    """
+
+    def __init__(self, manager: ConfigManager, interval: float, debounce: float,
+                 on_groups_changed: Optional[Callable[[Set[str]], Any]] = None,
+                 on_reco_changed: Optional[Callable[[Set[str]], Any]] = None):
+        self.manager = manager
+        self.interval = interval
+        self.debounce = debounce
+        self.on_groups_changed = on_groups_changed
+        self.on_reco_changed = on_reco_changed
+        # 检测到变化但还在等待稳定的文件：路径 -> (最近一次看到的 mtime, 看到的时间)
+        self._pending: Dict[Path, Tuple[Optional[float], float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                metrics.error("watch", e)
+                logger.warning(f"[QQMusicReco] 配置文件监视出错: {e}")
+
+    def poll(self):
+        now = time.monotonic()
+        changed = set(self.manager.changed_files())
+
+        # 已经恢复原状(或被插件自己写回)的文件不再等待
+        for path in list(self._pending):
+            if path not in changed:
+                del self._pending[path]
+
+        for path in changed:
+            mtime = self.manager.file_mtime(path)
+            seen = self._pending.get(path)
+            if seen is None or seen[0] != mtime:
+                # 新的修改：重新开始计时，连续快速编辑只会在最后一次之后重载一次
+                self._pending[path] = (mtime, now)
+                continue
+            if now - seen[1] >= self.debounce:
+                del self._pending[path]
+                self.reload(path)
+
+    def reload(self, path: Path):
+        m = self.manager
+        if path == m.group_file:
+            changed = m.load_groups()
+            if changed is None:
+                return
+            logger.info(f"[QQMusicReco] 检测到 {path.name} 变化，已重载 {len(changed)} 个群订阅")
+            if changed and self.on_groups_changed:
+                self.on_groups_changed(changed)
+        elif path == m.reco_file:
+            changed = m.load_reco()
+            if changed is None:
+                return
+            logger.info(f"[QQMusicReco] 检测到 {path.name} 变化，已重载 {len(changed)} 个推荐配置")
+            if changed and self.on_reco_changed:
+                self.on_reco_changed(changed)
+        elif path == m.cute_file:
+            m.set_cute_config(m.load_cute_messages())
+            logger.info(f"[QQMusicReco] 检测到 {path.name} 变化，已重载自定义话术")
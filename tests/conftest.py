@@ -0,0 +1,19 @@
+import tempfile
+
+import nonebot
+import pytest
+from nonebug import NONEBOT_INIT_KWARGS
+
+
+def pytest_configure(config: pytest.Config):
+    data_dir = tempfile.mkdtemp(prefix="qqmusic_reco_test_")
+    config.stash[NONEBOT_INIT_KWARGS] = {
+        "localstore_data_dir": data_dir,
+        "localstore_cache_dir": data_dir,
+        "localstore_config_dir": data_dir,
+    }
+
+
+@pytest.fixture(scope="session", autouse=True)
+def load_plugin(nonebug_init: None):
+    nonebot.require("nonebot_plugin_qqmusic_reco")
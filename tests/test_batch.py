@@ -0,0 +1,102 @@
+import json
+from typing import Dict, List
+
+import httpx
+import pytest
+
+SONGS = 3
+
+
+def cd(disstid: str) -> Dict:
+    return {
+        "disstid": disstid,
+        "songlist": [
+            {"songmid": f"{disstid}_{i}", "songname": f"song{i}", "singer": [{"name": "singer"}]}
+            for i in range(SONGS)
+        ],
+    }
+
+
+class FakeApi:
+    """batch 为 False 时只返回第一个歌单(不支持批量的接口)；fail_batch 为 True 时批量请求返回 500"""
+
+    def __init__(self, batch: bool = True, fail_batch: bool = False):
+        self.batch = batch
+        self.fail_batch = fail_batch
+        self.requests: List[List[str]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        disstids = request.url.params["disstid"].split(",")
+        self.requests.append(disstids)
+        if len(disstids) > 1:
+            if self.fail_batch:
+                return httpx.Response(500)
+            if not self.batch:
+                disstids = disstids[:1]
+        return httpx.Response(200, content=json.dumps({"code": 0, "cdlist": [cd(d) for d in disstids]}))
+
+
+@pytest.fixture
+def make_service():
+    from nonebot_plugin_qqmusic_reco.config import Config
+    from nonebot_plugin_qqmusic_reco.data_source import QQMusicReco
+
+    def make(api: FakeApi) -> QQMusicReco:
+        svc = QQMusicReco(Config(qqmusic_breaker_threshold=0))
+        svc._client = httpx.AsyncClient(transport=httpx.MockTransport(api))
+        return svc
+
+    return make
+
+
+async def fetch(svc, *disstids: str) -> Dict[str, int]:
+    return {d: len(songs) for d, songs in (await svc.fetch_playlists(list(disstids))).items()}
+
+
+async def test_batch_failures_fall_back_without_disabling_batch(make_service):
+    api = FakeApi(fail_batch=True)
+    svc = make_service(api)
+    for _ in range(5):
+        assert await fetch(svc, "10001", "10002", "10003") == {"10001": SONGS, "10002": SONGS, "10003": SONGS}
+    assert svc.batch_supported
+    assert svc._batch_rejects == 0
+    # 每轮一次失败的批量请求 + 三次逐个请求
+    assert len(api.requests) == 5 * 4
+
+
+async def test_rejected_batches_disable_batch_then_reprobe(make_service, monkeypatch):
+    from nonebot_plugin_qqmusic_reco import data_source
+
+    now = [1000.0]
+    monkeypatch.setattr(data_source.time, "monotonic", lambda: now[0])
+    api = FakeApi(batch=False)
+    svc = make_service(api)
+
+    assert await fetch(svc, "10001", "10002") == {"10001": SONGS, "10002": SONGS}
+    assert svc.batch_supported
+    await fetch(svc, "10001", "10002")
+    assert not svc.batch_supported
+
+    # 到期后重新试探：接口仍不支持，一次被拒就再次停用
+    now[0] += data_source.BATCH_RETRY_INTERVAL
+    assert svc.batch_supported
+    await fetch(svc, "10001", "10002")
+    assert not svc.batch_supported
+
+    # 接口恢复批量后，下一次试探成功即恢复
+    api.batch = True
+    now[0] += data_source.BATCH_RETRY_INTERVAL
+    assert await fetch(svc, "10001", "10002") == {"10001": SONGS, "10002": SONGS}
+    assert svc.batch_supported
+    assert svc._batch_rejects == 0
+    assert api.requests[-1] == ["10001", "10002"]
+
+
+async def test_transient_failure_between_rejects_does_not_count(make_service):
+    api = FakeApi(batch=False)
+    svc = make_service(api)
+    await fetch(svc, "10001", "10002")
+    api.fail_batch = True
+    await fetch(svc, "10001", "10002")
+    assert svc.batch_supported
+    assert svc._batch_rejects == 1
@@ -0,0 +1,118 @@
+import math
+import random
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+# (disstid, 权重, 歌曲)：A 重复出现且权重以最后一次为准，C 权重为 0，总数 13 > MAX_POOL 触发截断
+PLAYLISTS = [
+    ("A", 5.0, ["A0", "A1", "A2", "A3"]),
+    ("B", 3.0, ["B0", "B1", "B2"]),
+    ("A", 1.0, ["A0", "A1", "A2", "A3"]),
+    ("C", 0.0, ["C0", "C1"]),
+]
+MAX_POOL = 6
+OUTPUT_N = 3
+DRAWS = 40000
+
+
+def baseline(playlists, output_n: int, max_pool: int, rng: random.Random) -> List[str]:
+    """原版 get_recommendation 的抽样流程：打乱截断成歌曲池，再逐首按来源权重不放回抽取"""
+    weights = {d: w for d, w, _ in playlists}
+    pool = [(d, s) for d, _, songs in playlists for s in songs]
+    if len(pool) > max_pool:
+        rng.shuffle(pool)
+        pool = pool[:max_pool]
+    by_pid: Dict[str, List[str]] = {}
+    for d, s in pool:
+        by_pid.setdefault(d, []).append(s)
+    pids = [p for p in by_pid if weights[p] > 0]
+    if not pids:
+        return []
+    picked = []
+    for _ in range(max(1, min(output_n, len(pool)))):
+        live = [(p, weights[p]) for p in pids if by_pid[p]]
+        if not live:
+            break
+        lpids, lweights = zip(*live)
+        target = by_pid[rng.choices(lpids, weights=lweights, k=1)[0]]
+        picked.append(target.pop(rng.randrange(len(target))))
+    return picked
+
+
+def draw_index(playlists, output_n: int, max_pool: int, rng: random.Random) -> List[str]:
+    from nonebot_plugin_qqmusic_reco.sampler import SamplingIndex
+
+    index = SamplingIndex([(d, w) for d, w, _ in playlists], [songs for _, _, songs in playlists])
+    return index.draw(output_n, max_pool, rng)
+
+
+def draw_reservoir(playlists, output_n: int, max_pool: int, rng: random.Random) -> List[str]:
+    from nonebot_plugin_qqmusic_reco.sampler import Reservoir
+
+    pool = Reservoir(max_pool, rng)
+    for d, _, songs in playlists:
+        pool.offer(d, songs)
+    return pool.draw({d: w for d, w, _ in playlists}, output_n)
+
+
+def outcomes(sampler, seed: int) -> Counter:
+    rng = random.Random(seed)
+    return Counter(tuple(sampler(PLAYLISTS, OUTPUT_N, MAX_POOL, rng)) for _ in range(DRAWS))
+
+
+def homogeneity(a: Counter, b: Counter, min_count: int = 10) -> Tuple[float, int]:
+    """两组等量样本的卡方齐性检验，频数过小的结果合并为一类"""
+    stat, df, rest_a, rest_b = 0.0, -1, 0, 0
+    for key in set(a) | set(b):
+        x, y = a[key], b[key]
+        if x + y < min_count:
+            rest_a, rest_b = rest_a + x, rest_b + y
+            continue
+        stat += (x - y) ** 2 / (x + y)
+        df += 1
+    if rest_a + rest_b:
+        stat += (rest_a - rest_b) ** 2 / (rest_a + rest_b)
+        df += 1
+    return stat, df
+
+
+def chi2_critical(df: int, z: float = 3.09) -> float:
+    # Wilson–Hilferty 近似，z=3.09 对应 p=0.001
+    return df * (1 - 2 / (9 * df) + z * math.sqrt(2 / (9 * df))) ** 3
+
+
+def assert_same_distribution(sampler, seed: int):
+    expected = outcomes(baseline, 1)
+    actual = outcomes(sampler, seed)
+    stat, df = homogeneity(expected, actual)
+    assert df > 0
+    assert stat < chi2_critical(df), f"chi2={stat:.1f}, df={df}"
+
+
+def test_index_matches_baseline():
+    assert_same_distribution(draw_index, 2)
+
+
+def test_reservoir_matches_baseline():
+    assert_same_distribution(draw_reservoir, 3)
+
+
+def test_zero_weight_sources_are_never_picked():
+    rng = random.Random(4)
+    for sampler in (draw_index, draw_reservoir):
+        for _ in range(1000):
+            assert not any(s.startswith("C") for s in sampler(PLAYLISTS, OUTPUT_N, MAX_POOL, rng))
+
+
+def test_only_zero_weight_sources_gives_empty():
+    playlists: Sequence = [("C", 0.0, ["C0", "C1"])]
+    rng = random.Random(5)
+    for sampler in (baseline, draw_index, draw_reservoir):
+        assert sampler(playlists, OUTPUT_N, MAX_POOL, rng) == []
+
+
+def test_output_capped_by_pool_size():
+    playlists = [("A", 1.0, ["A0", "A1"])]
+    rng = random.Random(6)
+    for sampler in (draw_index, draw_reservoir):
+        assert sorted(sampler(playlists, 5, MAX_POOL, rng)) == ["A0", "A1"]